@@ -0,0 +1,222 @@
+"""
+Web Grab & Capture - Admission Control
+=======================================
+Load shedding in front of the scraping endpoints. Every scrape holds a
+parsed page and possibly image bytes in memory, so instead of accepting
+unlimited concurrent work until the process is killed, at most
+MAX_IN_FLIGHT guarded requests run at once and up to MAX_QUEUED more wait
+for a slot (for at most QUEUE_TIMEOUT seconds). Requests beyond that are
+turned away immediately with 503 and a Retry-After header, as are
+requests that waited too long. A single client may only hold
+MAX_PER_CLIENT running or queued requests; more get 429.
+
+With several API workers and the shared store enabled (sharedstore.py),
+the per-client cap is counted across all workers. The in-flight and queue
+limits stay per worker, as they bound that worker's memory.
+
+Clients are identified by the X-Real-IP header set by nginx (see
+nginx-webgrab.conf), falling back to the socket address.
+
+AdmissionMiddleware is plain ASGI, so streaming responses (archives, SSE,
+NDJSON) keep their slot until the last byte is sent.
+"""
+
+import asyncio
+import json
+from collections import Counter, deque
+from typing import Optional, Tuple
+
+from settings import env_int
+
+# ============== Settings ==============
+
+MAX_IN_FLIGHT = env_int("WEBGRAB_MAX_IN_FLIGHT", 32)
+MAX_QUEUED = env_int("WEBGRAB_MAX_QUEUED", 64)
+QUEUE_TIMEOUT = env_int("WEBGRAB_QUEUE_TIMEOUT", 10)
+MAX_PER_CLIENT = env_int("WEBGRAB_MAX_PER_CLIENT", 8)
+
+# Seconds clients are told to wait before retrying a rejected request
+RETRY_AFTER = env_int("WEBGRAB_RETRY_AFTER", 5)
+
+# Path prefixes that do scraping work and go through admission control
+GUARDED_PATHS = ("/api/scrape", "/api/contact", "/api/social", "/api/meta", "/api/images", "/api/icons")
+
+class Rejected(Exception):
+    """The request was not admitted; carries the HTTP status and reason"""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+# ============== Limiter ==============
+
+class AdmissionLimiter:
+    """Concurrency limit with a bounded FIFO wait queue and a per-client cap"""
+
+    def __init__(self, limit: int = MAX_IN_FLIGHT, queue: int = MAX_QUEUED,
+                 timeout: float = QUEUE_TIMEOUT, per_client: int = MAX_PER_CLIENT, shared=None):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.per_client = per_client
+        self.shared = shared
+        self._in_flight = 0
+        self._waiters = deque()
+        self._clients = Counter()
+        self._stats = {"admitted": 0, "queued_total": 0, "rejected_queue_full": 0,
+                       "rejected_timeout": 0, "rejected_client": 0, "peak_in_flight": 0}
+
+    async def acquire(self, client: str) -> Optional[str]:
+        """
+        Wait for a slot; raises Rejected when the server or this client is saturated.
+
+        Returns the client's ticket in the shared store (None without one),
+        to be handed back to release().
+        """
+        ticket = None
+        if self.per_client and self.shared is not None:
+            ticket = await asyncio.to_thread(self.shared.acquire_slot, client, self.per_client)
+            over_limit = ticket is None
+        else:
+            over_limit = self.per_client and self._clients[client] >= self.per_client
+        if over_limit:
+            self._stats["rejected_client"] += 1
+            raise Rejected(429, f"Too many concurrent requests from this client (limit {self.per_client})")
+
+        # Queued requests count against the client too
+        self._clients[client] += 1
+        try:
+            if self._in_flight < self.limit and not self._waiters:
+                self._admit()
+            elif len(self._waiters) >= self.queue:
+                self._stats["rejected_queue_full"] += 1
+                raise Rejected(503, "Server is at capacity, try again shortly")
+            else:
+                await self._wait()
+        except BaseException:
+            self._forget(client)
+            if ticket:
+                await asyncio.shield(asyncio.to_thread(self.shared.release_slot, ticket))
+            raise
+        return ticket
+
+    async def _wait(self):
+        # release() hands its slot straight to the first waiter by resolving its future
+        slot = asyncio.get_running_loop().create_future()
+        self._waiters.append(slot)
+        self._stats["queued_total"] += 1
+        try:
+            await asyncio.wait({slot}, timeout=self.timeout)
+        except asyncio.CancelledError:
+            # Client went away while queued; give back a slot we were handed meanwhile
+            if slot.done():
+                self._release_slot()
+            else:
+                self._waiters.remove(slot)
+            raise
+        if not slot.done():
+            self._waiters.remove(slot)
+            self._stats["rejected_timeout"] += 1
+            raise Rejected(503, f"Server is busy, no slot became free within {self.timeout}s")
+        self._stats["admitted"] += 1
+
+    def _admit(self):
+        self._in_flight += 1
+        self._stats["admitted"] += 1
+        self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._in_flight)
+
+    def _forget(self, client: str):
+        self._clients[client] -= 1
+        if self._clients[client] <= 0:
+            del self._clients[client]
+
+    async def release(self, client: str, ticket: Optional[str] = None):
+        """Free the client's slot (and its shared-store ticket)"""
+        self._forget(client)
+        self._release_slot()
+        if ticket:
+            # Shielded: a cancelled request must not leave its ticket behind in the shared store
+            await asyncio.shield(asyncio.to_thread(self.shared.release_slot, ticket))
+
+    def _release_slot(self):
+        # Pass the slot to the longest-waiting request if there is one
+        while self._waiters:
+            slot = self._waiters.popleft()
+            if not slot.done():
+                slot.set_result(None)
+                return
+        self._in_flight -= 1
+
+    def stats(self) -> dict:
+        """Gauges (in flight, queued, clients) and counters"""
+        return {
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "clients": len(self._clients),
+            **self._stats,
+            "max_in_flight": self.limit,
+            "max_queued": self.queue,
+            "queue_timeout": self.timeout,
+            "max_per_client": self.per_client,
+            "shared_per_client": self.shared is not None,
+        }
+
+# ============== Middleware ==============
+
+def guarded(scope, paths: Tuple[str, ...] = GUARDED_PATHS) -> bool:
+    """Whether an ASGI scope is an HTTP request under one of `paths` (relative to any root_path)"""
+    if scope["type"] != "http":
+        return False
+    path = scope["path"]
+    root_path = scope.get("root_path", "")
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    return path.startswith(paths)
+
+def client_id(scope) -> str:
+    """The client's address: nginx's X-Real-IP, else the peer address"""
+    for name, value in scope.get("headers", []):
+        if name == b"x-real-ip":
+            return value.decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+class AdmissionMiddleware:
+    """ASGI middleware putting requests under `paths` through an AdmissionLimiter"""
+
+    def __init__(self, app, limiter: AdmissionLimiter, paths: Tuple[str, ...] = GUARDED_PATHS,
+                 retry_after: int = RETRY_AFTER):
+        self.app = app
+        self.limiter = limiter
+        self.paths = paths
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        if not guarded(scope, self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        client = client_id(scope)
+        try:
+            ticket = await self.limiter.acquire(client)
+        except Rejected as e:
+            await self.reject(send, e)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await self.limiter.release(client, ticket)
+
+    async def reject(self, send, rejection: Rejected):
+        body = json.dumps({"detail": rejection.detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": rejection.status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -15,21 +15,45 @@ try:
 except ImportError:
     pass
 
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, HttpUrl, Field
-from typing import Optional, List
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from typing import Any, Dict, Literal, Optional, List
+from contextlib import asynccontextmanager
+from bs4 import BeautifulSoup, NavigableString
+from urllib.parse import urldefrag, urljoin, urlparse
 import re
-import io
-import zipfile
+import asyncio
+import hashlib
+import json
+import time
 from pathlib import Path
 
+import fetcher
+from admission import AdmissionLimiter, AdmissionMiddleware
+from archive import DEFAULT_COMPRESSION_LEVEL, MANIFEST_NAME, ZipStream
+import archive_cache
+import jobs
+import sharedstore
+import snapshots
+from cache import ResultCache, SingleFlight, cache_key, canonical_url
+import deadlines
+from deadlines import DeadlineMiddleware
+from fastjson import FastJSONResponse, dumps
+from settings import env_int
+
 # ============== API Setup ==============
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the background job workers; stop them and release pooled HTTP connections on shutdown"""
+    await job_workers.start()
+    yield
+    await job_workers.stop()
+    await fetcher.close_client()
+
 app = FastAPI(
     title="Web Grab & Capture API",
     description="""
@@ -52,6 +76,8 @@ print(data["company"]["name"])
     """,
     version="1.0.0",
     root_path="/webgrab-api",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
     contact={
         "name": "Lucas E. Carpenter",
         "url": "https://lucascode.org",
@@ -62,6 +88,13 @@ print(data["company"]["name"])
     }
 )
 
+# Load shedding for the scraping endpoints (added first so CORS headers reach rejections too)
+admission_limiter = AdmissionLimiter(shared=sharedstore.store)
+app.add_middleware(AdmissionMiddleware, limiter=admission_limiter)
+
+# Request deadlines, counted from arrival so time spent queued for admission counts too
+app.add_middleware(DeadlineMiddleware)
+
 # CORS middleware for cross-origin requests
 app.add_middleware(
     CORSMiddleware,
@@ -73,14 +106,26 @@ app.add_middleware(
 
 # ============== Models ==============
 
+# Batch scraping: most URLs per request, and default/maximum pages scraped at once
+BATCH_MAX_URLS = env_int("WEBGRAB_BATCH_MAX_URLS", 10000)
+BATCH_CONCURRENCY = 16
+BATCH_MAX_CONCURRENCY = env_int("WEBGRAB_BATCH_MAX_CONCURRENCY", 64)
+
 class PhoneNumber(BaseModel):
     number: str = Field(..., description="Phone number")
     label: str = Field(..., description="Context label (e.g., Sales, Support, Main)")
 
+class ContactSources(BaseModel):
+    emails: Dict[str, str] = Field(default_factory=dict, description="Page each email address was found on")
+    phones: Dict[str, str] = Field(default_factory=dict, description="Page each phone number was found on")
+    address: Optional[str] = Field(None, description="Page the address was found on")
+
 class ContactInfo(BaseModel):
     emails: List[str] = Field(default_factory=list, description="Email addresses found")
     phones: List[PhoneNumber] = Field(default_factory=list, description="Phone numbers with labels")
     address: Optional[str] = Field(None, description="Physical address if found")
+    sources: Optional[ContactSources] = Field(None, description="Where each value was found (with `depth` > 0)")
+    pages: Optional[List[str]] = Field(None, description="Pages the contact info was gathered from, the scraped page first (with `depth` > 0)")
 
 class SocialMedia(BaseModel):
     linkedin: Optional[str] = None
@@ -93,6 +138,11 @@ class ImageInfo(BaseModel):
     type: str = Field(..., description="Image type: favicon, logo, or image")
     url: str = Field(..., description="Full URL to the image")
     alt: Optional[str] = Field(None, description="Alt text if available")
+    duplicates: int = Field(0, description="Further references to the same URL on the page, merged into this entry")
+    format: Optional[str] = Field(None, description="Format sniffed from the file header (with `probe=true`)")
+    width: Optional[int] = Field(None, description="Width in pixels (with `probe=true`)")
+    height: Optional[int] = Field(None, description="Height in pixels (with `probe=true`)")
+    bytes: Optional[int] = Field(None, description="File size in bytes if the server reports it (with `probe=true`)")
 
 class CompanyInfo(BaseModel):
     name: Optional[str] = Field(None, description="Company or website name")
@@ -103,32 +153,167 @@ class CompanyInfo(BaseModel):
 class ScrapeResponse(BaseModel):
     success: bool
     url: str = Field(..., description="Final URL after redirects")
-    company: CompanyInfo
-    contact: ContactInfo
-    social: SocialMedia
-    images: List[ImageInfo]
-    image_count: int
-    logo_count: int
+    company: Optional[CompanyInfo] = Field(None, description="Present when `company` is requested")
+    contact: Optional[ContactInfo] = Field(None, description="Present when `contact` is requested")
+    social: Optional[SocialMedia] = Field(None, description="Present when `social` is requested")
+    images: Optional[List[ImageInfo]] = Field(None, description="Present when `images` is requested")
+    image_count: Optional[int] = Field(None, description="Images on the page (matching `images_type`), across every page of the list")
+    logo_count: Optional[int] = Field(None, description="Logos and favicons among them")
+    images_next_cursor: Optional[str] = Field(None, description="Pass as `images_cursor` to get the next page of images; absent on the last page")
+    truncated: Optional[bool] = Field(None, description="Present (true) when a time limit cut the result short, e.g. some images were not probed")
 
 class ErrorResponse(BaseModel):
     success: bool = False
     error: str
     detail: Optional[str] = None
 
+class BatchScrapeRequest(BaseModel):
+    urls: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_URLS, description="Website URLs to scrape")
+    fields: Optional[str] = Field(None, description="Comma-separated sections to return: company, contact, social, images (default: all)")
+    concurrency: int = Field(BATCH_CONCURRENCY, ge=1, le=BATCH_MAX_CONCURRENCY, description="Pages scraped at the same time")
+    no_cache: bool = Field(False, description="Skip the result and snapshot caches and fetch every page again")
+    probe: bool = Field(False, description="Probe each image for its format, dimensions and size")
+
+class BatchScrapeError(ErrorResponse):
+    index: int = Field(..., description="Position of the URL in the request")
+    url: str = Field(..., description="The URL as requested")
+    status_code: int = Field(..., description="HTTP status /api/scrape would have returned")
+
+class JobRequest(BaseModel):
+    kind: Literal["scrape", "batch", "images", "icons"] = Field(..., description="What to run: one scrape, a batch of scrapes, or an image/icon archive")
+    url: Optional[str] = Field(None, description="Website URL (scrape, images, icons)")
+    urls: Optional[List[str]] = Field(None, min_length=1, max_length=BATCH_MAX_URLS, description="Website URLs (batch)")
+    fields: Optional[str] = Field(None, description="Comma-separated sections to return (scrape, batch)")
+    probe: bool = Field(False, description="Probe each image for its format, dimensions and size (scrape, batch)")
+    no_cache: bool = Field(False, description="Skip the result and snapshot caches (scrape, batch)")
+    concurrency: int = Field(BATCH_CONCURRENCY, ge=1, le=BATCH_MAX_CONCURRENCY, description="Pages scraped at the same time (batch)")
+    compression_level: int = Field(DEFAULT_COMPRESSION_LEVEL, ge=0, le=9, description="Deflate level for non-compressed formats (images, icons)")
+    max_images: Optional[int] = Field(None, ge=1, description="Most images to put in the archive (images, icons)")
+    max_bytes: Optional[int] = Field(None, ge=1, description="Most bytes of image data in the archive (images, icons)")
+    max_image_bytes: Optional[int] = Field(None, ge=1, description="Skip any single image larger than this (images, icons)")
+
+class JobProgress(BaseModel):
+    done: int = Field(0, description="URLs scraped or images downloaded so far")
+    total: Optional[int] = Field(None, description="Total to do, once known")
+
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    status: str = Field(..., description="queued, running, done or failed")
+    progress: JobProgress
+    result: Optional[Any] = Field(None, description="ScrapeResponse (scrape), list of batch lines (batch), or archive details (images, icons)")
+    error: Optional[str] = Field(None, description="Why the job failed")
+    archive_url: Optional[str] = Field(None, description="Download link for the finished archive (images, icons)")
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
 # ============== Core Functions ==============
 
-def get_soup(url: str):
-    """Fetch and parse a webpage"""
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"}
-    response = requests.get(url, headers=headers, timeout=15)
-    response.raise_for_status()
-    return BeautifulSoup(response.content, "lxml"), response.url
+# Scrape, contact and social results, shared by all requests in this process
+# (and with the other workers through the shared store in multi-worker mode)
+result_cache = ResultCache(shared=sharedstore.store)
 
-def extract_meta(soup) -> dict:
-    """Extract company/meta information"""
+# Identical requests that arrive while one is already running share its work
+flights = SingleFlight()
+
+async def request_timeout(
+    timeout: Optional[float] = Query(None, gt=0, le=deadlines.REQUEST_TIMEOUT,
+                                     description=f"Seconds to spend on this request (at most {deadlines.REQUEST_TIMEOUT}); slower work is cut off and partial results are flagged `truncated`")
+):
+    """Dependency shortening the request's deadline (set by DeadlineMiddleware) to `timeout`"""
+    deadline = deadlines.current()
+    if timeout is not None and deadline is not None:
+        deadline.shorten(timeout)
+
+async def cached_result(key: str, compute, no_cache: bool = False, partial: bool = False):
+    """Return (value, cache_status) for `compute()`'s result, sharing concurrent misses (across workers with the shared store)"""
+    flight_key = f"{key}|refresh" if no_cache else key
+    
+    async def compute_once():
+        if partial and deadlines.current() is not None:
+            # `compute()` stops early at the request's deadline and returns what it has (truncated), so each
+            # request runs its own; the page fetch, probes and crawled pages underneath are still shared
+            return await compute()
+        return await flights.do(flight_key, lambda: result_cache.compute_shared(flight_key, key, compute))
+    
+    return await result_cache.get_or_compute(key, compute_once, bypass=no_cache)
+
+async def cached(response: Response, key: str, compute, no_cache: bool = False, partial: bool = False):
+    """Serve `compute()`'s result through the result cache and report it in a Cache-Status header"""
+    value, status = await cached_result(key, compute, no_cache, partial)
+    response.headers["Cache-Status"] = status
+    return value
+
+async def get_page_images(url: str):
+    """Fetch a page and extract its images, sharing the work with concurrent requests for the same URL"""
+    async def compute():
+        soup, final_url = await get_soup(url)
+        return final_url, await run_in_threadpool(extract_images, soup, final_url)
+    
+    return await flights.do(cache_key("page-images", url), compute)
+
+async def fetch_image_shared(url: str, max_bytes: Optional[int] = None):
+    """fetch_image, with concurrent downloads of the same image URL (and size limit) sharing one request"""
+    return await flights.do(f"image|{url}|{max_bytes}", lambda: fetcher.fetch_image(url, max_bytes))
+
+async def probe_image_shared(url: str):
+    """probe_image, with concurrent probes of the same image URL sharing one request"""
+    return await flights.do(f"probe|{url}", lambda: fetcher.probe_image(url))
+
+async def probe_images(images: list) -> bool:
+    """Add format, width, height and bytes to each image entry from a header-only probe of its URL; returns False if the deadline cut probing short"""
+    for img in images:
+        img.update({"format": None, "width": None, "height": None, "bytes": None})
+    probed = 0
+    async for i, info in fetcher.iter_images([img["url"] for img in images], fetch=probe_image_shared):
+        probed += 1
+        images[i].update(info or {})
+    return probed == len(images)
+
+async def get_soup(url: str, head_only: bool = False, refresh: bool = False):
+    """Fetch a webpage (only its <head> with `head_only`, bypassing snapshots with `refresh`) and parse it off the event loop"""
+    try:
+        content, final_url = await fetcher.fetch_page(url, head_only=head_only, refresh=refresh)
+    except fetcher.ResponseTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except fetcher.UnsupportedContentType as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except (deadlines.DeadlineExceeded, *fetcher.FETCH_ERRORS) as e:
+        if deadlines.expired():
+            raise deadline_error()
+        raise
+    soup = await run_in_threadpool(BeautifulSoup, content, "lxml")
+    return soup, final_url
+
+def deadline_error() -> HTTPException:
+    """The 504 reported when the request's deadline passes before there is anything to return"""
+    deadline = deadlines.current()
+    detail = f"Request deadline of {deadline.timeout:g}s exceeded" if deadline is not None else "Deadline exceeded"
+    return HTTPException(status_code=504, detail=detail)
+
+# Patterns shared by the per-extractor functions and the single-pass scan
+EMAIL_RE = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
+TEL_HREF_RE = re.compile(r"tel:", re.I)
+PHONE_LABEL_RE = re.compile(r"(phone|tel|call|fax|mobile|cell)[:\s]*", re.I)
+PHONE_NUMBER_RE = re.compile(r"(phone|tel|call|fax|mobile|cell)[:\s]*([\+\d\s\-\(\)\.]{7,20})", re.I)
+ADDRESS_CLASS_RE = re.compile(r"address|contact|location", re.I)
+ICON_REL_RE = re.compile(r"icon", re.I)
+
+MAX_LABELED_PHONES = 10
+MAX_PHONES = 15
+
+# Sections of /api/scrape that can be requested with `fields=`
+SCRAPE_FIELDS = ("company", "contact", "social", "images")
+
+# Sections that can be answered from <head> alone (title, meta tags)
+HEAD_FIELDS = ("company",)
+
+def build_meta(title_tag, meta_tags) -> dict:
+    """Build company/meta information from the <title> tag and <meta> tags"""
     meta = {}
-    meta["title"] = soup.title.string.strip() if soup.title and soup.title.string else ""
-    for tag in soup.find_all("meta"):
+    meta["title"] = title_tag.string.strip() if title_tag and title_tag.string else ""
+    for tag in meta_tags:
         name = tag.get("name", tag.get("property", "")).lower()
         if name in ["description", "og:description"]:
             meta["description"] = tag.get("content", "")
@@ -140,12 +325,12 @@ def extract_meta(soup) -> dict:
         meta["company_name"] = meta.get("title", "").split("|")[0].split("-")[0].strip()
     return meta
 
-def extract_contact(soup, text: str) -> dict:
-    """Extract contact information"""
+def build_contact(text: str, tel_links, phone_strings, address_tag) -> dict:
+    """Build contact information from page text, tel: links, phone-labelled strings and the address element"""
     contact = {"emails": [], "phones": [], "address": ""}
     
     # Emails
-    emails = re.findall(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}", text)
+    emails = EMAIL_RE.findall(text)
     contact["emails"] = list(set(emails)) if emails else []
     
     # Phones with context
@@ -153,7 +338,7 @@ def extract_contact(soup, text: str) -> dict:
     seen_numbers = set()
     
     # Method 1: tel: links
-    for a in soup.find_all("a", href=re.compile(r"tel:", re.I)):
+    for a in tel_links:
         phone = a.get("href", "").replace("tel:", "").strip()
         if phone and phone not in seen_numbers:
             parent = a.find_parent(["div", "li", "p", "span"])
@@ -169,12 +354,11 @@ def extract_contact(soup, text: str) -> dict:
             seen_numbers.add(phone)
     
     # Method 2: Labeled phone patterns
-    phone_patterns = soup.find_all(string=re.compile(r"(phone|tel|call|fax|mobile|cell)[:\s]*", re.I))
-    for pattern in phone_patterns[:10]:
+    for pattern in phone_strings[:MAX_LABELED_PHONES]:
         parent = pattern.find_parent()
         if parent:
             full_text = parent.get_text(" ", strip=True)
-            match = re.search(r"(phone|tel|call|fax|mobile|cell)[:\s]*([\+\d\s\-\(\)\.]{7,20})", full_text, re.I)
+            match = PHONE_NUMBER_RE.search(full_text)
             if match:
                 label, number = match.groups()
                 clean_num = re.sub(r"[^\d+]", "", number)
@@ -182,18 +366,17 @@ def extract_contact(soup, text: str) -> dict:
                     phones_with_context.append({"number": number.strip(), "label": label.strip().title()})
                     seen_numbers.add(clean_num)
     
-    contact["phones"] = phones_with_context[:15]
+    contact["phones"] = phones_with_context[:MAX_PHONES]
     
     # Address
-    addr_div = soup.find(class_=re.compile(r"address|contact|location", re.I))
-    contact["address"] = addr_div.get_text(strip=True)[:200] if addr_div else ""
+    contact["address"] = address_tag.get_text(strip=True)[:200] if address_tag else ""
     
     return contact
 
-def extract_social(soup, base_url: str) -> dict:
-    """Extract social media links"""
+def build_social(links) -> dict:
+    """Build social media links from <a href> tags"""
     social = {"linkedin": "", "twitter": "", "facebook": "", "instagram": "", "youtube": ""}
-    for a in soup.find_all("a", href=True):
+    for a in links:
         href = a["href"].lower()
         for platform in social:
             if platform in href or (platform == "twitter" and "x.com" in href):
@@ -201,48 +384,703 @@ def extract_social(soup, base_url: str) -> dict:
                 break
     return social
 
-def extract_images(soup, base_url: str) -> list:
-    """Extract all images including favicons and logos"""
-    images = []
+# When one URL is referenced as several types, the merged entry keeps the most specific;
+# archives are also filled in this order
+IMAGE_TYPE_PRIORITY = {"favicon": 0, "logo": 1, "image": 2}
+
+# Pixel sizes in width/height attributes ("400", "400px"; percentages don't count)
+DIMENSION_ATTR_RE = re.compile(r"^\s*(\d+)\s*(?:px)?\s*$", re.I)
+
+def declared_area(img) -> Optional[int]:
+    """Width x height declared on an <img> tag, or None if either is missing or relative"""
+    width = DIMENSION_ATTR_RE.match(img.get("width") or "")
+    height = DIMENSION_ATTR_RE.match(img.get("height") or "")
+    if width and height:
+        return int(width.group(1)) * int(height.group(1))
+    return None
+
+def image_priority(img: dict) -> tuple:
+    """Sort key for filling archives: favicons, then logos, then images by declared size (largest first, unknown last)"""
+    area = img.get("declared_area")
+    return IMAGE_TYPE_PRIORITY[img["type"]], area is None, -(area or 0)
+
+def build_images(icon_links, img_tags, base_url: str, types: Optional[tuple] = None) -> list:
+    """Build the image list from <link rel=icon> and <img> tags, one entry per URL (optionally only the given `types`)"""
+    return build_image_page(icon_links, img_tags, base_url, types)["images"]
+
+def build_image_page(icon_links, img_tags, base_url: str, types: Optional[tuple] = None,
+                     offset: int = 0, limit: Optional[int] = None) -> dict:
+    """Build the image entries from `offset` to `offset + limit` as {images, total, logos, next_offset}; the rest are only counted"""
+    refs = {}  # url -> [merged type, referencing tags], in page order
+    
+    def add(url: str, img_type: str, tag):
+        found = refs.get(url)
+        if found is None:
+            refs[url] = [img_type, [tag]]
+            return
+        found[1].append(tag)
+        if IMAGE_TYPE_PRIORITY[img_type] < IMAGE_TYPE_PRIORITY[found[0]]:
+            found[0] = img_type
     
     # Favicons
-    for link in soup.find_all("link", rel=re.compile(r"icon", re.I)):
+    for link in icon_links:
         href = link.get("href")
         if href:
-            images.append({"type": "favicon", "url": urljoin(base_url, href), "alt": "favicon"})
+            add(urljoin(base_url, href), "favicon", link)
     
     # Images
-    for img in soup.find_all("img"):
+    for img in img_tags:
         src = img.get("src") or img.get("data-src") or ""
         if not src:
             continue
-        full_url = urljoin(base_url, src)
         img_type = "logo" if re.search(r"logo", src + str(img.get("class", [])) + str(img.get("alt", "")), re.I) else "image"
-        images.append({"type": img_type, "url": full_url, "alt": img.get("alt", "")})
+        add(urljoin(base_url, src), img_type, img)
     
-    return images
+    matching = [(url, img_type, tags) for url, (img_type, tags) in refs.items() if not types or img_type in types]
+    end = len(matching) if limit is None else min(offset + limit, len(matching))
+    return {
+        "images": [image_entry(url, img_type, tags) for url, img_type, tags in matching[offset:end]],
+        "total": len(matching),
+        "logos": sum(1 for _, img_type, _ in matching if img_type in ("logo", "favicon")),
+        "next_offset": end if end < len(matching) else None,
+    }
 
-def download_images_to_zip(images: list, filter_type: list = None) -> io.BytesIO:
-    """Download images and create a ZIP archive"""
-    buffer = io.BytesIO()
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+def image_entry(url: str, img_type: str, tags: list) -> dict:
+    """The image list entry for one URL, merging alt text and declared size from every tag referencing it"""
+    entry = {"type": img_type, "url": url}
+    for tag in tags:
+        alt, area = ("favicon", None) if tag.name == "link" else (tag.get("alt", ""), declared_area(tag))
+        if "alt" not in entry:
+            entry.update(alt=alt, declared_area=area)
+            continue
+        if not entry["alt"] and alt:
+            entry["alt"] = alt
+        if area is not None:
+            entry["declared_area"] = max(entry["declared_area"] or 0, area)
+    entry["duplicates"] = len(tags) - 1
+    return entry
+
+def extract_meta(soup) -> dict:
+    """Extract company/meta information"""
+    return build_meta(soup.title, soup.find_all("meta"))
+
+def extract_contact(soup, text: str) -> dict:
+    """Extract contact information"""
+    return build_contact(
+        text,
+        soup.find_all("a", href=TEL_HREF_RE),
+        soup.find_all(string=PHONE_LABEL_RE),
+        soup.find(class_=ADDRESS_CLASS_RE),
+    )
+
+def extract_social(soup, base_url: str) -> dict:
+    """Extract social media links"""
+    return build_social(soup.find_all("a", href=True))
+
+def extract_images(soup, base_url: str, types: Optional[tuple] = None) -> list:
+    """Extract all images including favicons and logos (or only the given `types`)"""
+    return build_images(soup.find_all("link", rel=ICON_REL_RE), soup.find_all("img"), base_url, types)
+
+def attr_matches(value, pattern) -> bool:
+    """Match an attribute against a regex the way BeautifulSoup's find_all does (each class/rel value, then the joined list)"""
+    if value is None:
+        return False
+    if isinstance(value, list):
+        return any(pattern.search(v) for v in value) or bool(pattern.search(" ".join(value)))
+    return bool(pattern.search(value))
+
+def scan_page(soup, fields=SCRAPE_FIELDS) -> dict:
+    """Collect the nodes the extractors for `fields` need in a single walk over the document"""
+    want_company = "company" in fields
+    want_contact = "contact" in fields
+    want_social = "social" in fields
+    want_images = "images" in fields
+    
+    # Nodes are visited once in document order, so each list matches what extract_*'s find_all() would return
+    text_types = soup.interesting_string_types or soup.MAIN_CONTENT_STRING_TYPES
+    nodes = {
+        "title": None, "metas": [], "texts": [], "tel_links": [], "phone_strings": [],
+        "links": [], "icons": [], "imgs": [], "address": None,
+    }
+    
+    for node in soup.descendants:
+        if isinstance(node, NavigableString):
+            if want_contact:
+                if type(node) in text_types:
+                    nodes["texts"].append(node)
+                if len(nodes["phone_strings"]) < MAX_LABELED_PHONES and PHONE_LABEL_RE.search(node):
+                    nodes["phone_strings"].append(node)
+            continue
+        
+        name = node.name
+        if name == "a":
+            href = node.get("href")
+            if href is not None:
+                if want_social:
+                    nodes["links"].append(node)
+                if want_contact and TEL_HREF_RE.search(href):
+                    nodes["tel_links"].append(node)
+        elif name == "img":
+            if want_images:
+                nodes["imgs"].append(node)
+        elif name == "meta":
+            if want_company:
+                nodes["metas"].append(node)
+        elif name == "link":
+            if want_images and attr_matches(node.get("rel"), ICON_REL_RE):
+                nodes["icons"].append(node)
+        elif name == "title" and nodes["title"] is None:
+            nodes["title"] = node
+        
+        if want_contact and nodes["address"] is None and attr_matches(node.get("class"), ADDRESS_CLASS_RE):
+            nodes["address"] = node
+    
+    return nodes
+
+def run_extractors(soup, base_url: str, fields=SCRAPE_FIELDS, image_query: Optional[dict] = None) -> dict:
+    """Run the extractors for `fields` in a single DOM walk (CPU-bound, call from a worker thread)"""
+    nodes = scan_page(soup, fields)
+    extracted = {field: build_section(field, nodes, base_url) for field in SCRAPE_FIELDS
+                 if field in fields and (field != "images" or image_query is None)}
+    if "images" in fields and image_query is not None:
+        page = build_image_page(nodes["icons"], nodes["imgs"], base_url, **image_query)
+        extracted["images"] = page.pop("images")
+        extracted["images_page"] = page
+    return extracted
+
+def build_section(field: str, nodes: dict, base_url: str):
+    """Build one scrape section from the nodes collected by scan_page()"""
+    if field == "company":
+        return build_meta(nodes["title"], nodes["metas"])
+    if field == "contact":
+        return build_contact("".join(nodes["texts"]), nodes["tel_links"], nodes["phone_strings"], nodes["address"])
+    if field == "social":
+        return build_social(nodes["links"])
+    return build_images(nodes["icons"], nodes["imgs"], base_url)
+
+def parse_fields(fields: Optional[str]) -> tuple:
+    """Parse a comma-separated `fields=` value into scrape sections (all of them when empty)"""
+    if not fields:
+        return SCRAPE_FIELDS
+    requested = {f.strip().lower() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(SCRAPE_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}. Choose from: {', '.join(SCRAPE_FIELDS)}")
+    return tuple(f for f in SCRAPE_FIELDS if f in requested)
+
+def parse_image_types(types: Optional[str]) -> Optional[tuple]:
+    """Parse a comma-separated `images_type=` value into image types (None for all of them)"""
+    if not types:
+        return None
+    requested = {t.strip().lower() for t in types.split(",") if t.strip()}
+    unknown = requested - set(IMAGE_TYPE_PRIORITY)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown image types: {', '.join(sorted(unknown))}. Choose from: {', '.join(IMAGE_TYPE_PRIORITY)}")
+    return tuple(t for t in IMAGE_TYPE_PRIORITY if t in requested)
+
+def parse_image_query(types: Optional[str], limit: Optional[int], cursor: Optional[str]) -> Optional[dict]:
+    """The build_image_page() arguments for `images_type`/`images_limit`/`images_cursor`, or None if none were given"""
+    if types is None and limit is None and cursor is None:
+        return None
+    if cursor is not None and not cursor.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid images_cursor; pass the images_next_cursor of the previous page")
+    return {"types": parse_image_types(types), "offset": int(cursor or 0), "limit": limit}
+
+# Response model fields in declaration order, for building results as plain dicts
+PHONE_FIELDS = tuple(PhoneNumber.model_fields)
+SOCIAL_FIELDS = tuple(SocialMedia.model_fields)
+IMAGE_FIELDS = tuple(ImageInfo.model_fields)
+
+def pick_fields(item: dict, fields: tuple) -> dict:
+    """The entries of `item` named in `fields`, in that order (what model_dump(exclude_unset=True) gives)"""
+    return {name: item[name] for name in fields if name in item}
+
+def build_scrape_response(final_url: str, extracted: dict) -> dict:
+    """Assemble a ScrapeResponse-shaped dict from run_extractors() output, without going through the models"""
+    result = {"success": True, "url": final_url}
+    if "company" in extracted:
+        meta = extracted["company"]
+        result["company"] = {
+            "name": meta.get("company_name"),
+            "description": meta.get("description"),
+            "keywords": meta.get("keywords"),
+            "title": meta.get("title")
+        }
+    if "contact" in extracted:
+        contact = extracted["contact"]
+        result["contact"] = {
+            "emails": contact["emails"],
+            "phones": [pick_fields(p, PHONE_FIELDS) for p in contact["phones"]],
+            "address": contact["address"] or None
+        }
+        if "sources" in contact:
+            result["contact"]["sources"] = contact["sources"]
+            result["contact"]["pages"] = contact["pages"]
+    if "social" in extracted:
+        result["social"] = pick_fields(extracted["social"], SOCIAL_FIELDS)
+    if "images" in extracted:
+        images = extracted["images"]
+        result["images"] = [pick_fields(img, IMAGE_FIELDS) for img in images]
+        page = extracted.get("images_page")
+        if page is None:
+            result["image_count"] = len(images)
+            result["logo_count"] = len([img for img in images if img["type"] in ["logo", "favicon"]])
+        else:
+            result["image_count"] = page["total"]
+            result["logo_count"] = page["logos"]
+            if page["next_offset"] is not None:
+                result["images_next_cursor"] = str(page["next_offset"])
+    return result
+
+def scrape_key(url: str, requested: tuple, probe: bool, image_query: Optional[dict] = None,
+               crawl: Optional[dict] = None) -> str:
+    """Result cache key for scrape(); each page of the image list and each crawl setting is cached on its own"""
+    options = [",".join(requested), probe]
+    if image_query is not None:
+        options += [",".join(image_query["types"] or ()), image_query["offset"], image_query["limit"]]
+    if crawl is not None:
+        options.append(f"crawl={crawl['depth']}/{crawl['max_pages']}")
+    return cache_key("scrape", url, *options)
+
+async def scrape(url: str, requested: tuple = SCRAPE_FIELDS, no_cache: bool = False, probe: bool = False,
+                 image_query: Optional[dict] = None, crawl: Optional[dict] = None):
+    """Scrape one page through the result cache, returning (ScrapeResponse dict, cache_status)"""
+    async def compute():
+        head_only = set(requested) <= set(HEAD_FIELDS)
+        soup, final_url = await get_soup(url, head_only=head_only, refresh=no_cache)
+        extracted = await run_in_threadpool(run_extractors, soup, final_url, requested, image_query)
+        steps = []
+        if probe and extracted.get("images"):
+            steps.append(probe_images(extracted["images"]))
+        if crawl is not None and "contact" in extracted:
+            steps.append(crawl_contact(soup, final_url, extracted, crawl, no_cache))
+        complete = all(await asyncio.gather(*steps))
+        result = build_scrape_response(final_url, extracted)
+        if not complete:
+            result["truncated"] = True
+        return result
     
-    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+    return await cached_result(scrape_key(url, requested, probe, image_query, crawl), compute, no_cache,
+                               partial=probe or crawl is not None)
+
+def scrape_error(e: Exception) -> HTTPException:
+    """The HTTP error /api/scrape reports for a failed scrape"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, deadlines.DeadlineExceeded) or deadlines.expired():
+        return deadline_error()
+    if isinstance(e, fetcher.FETCH_ERRORS):
+        return HTTPException(status_code=400, detail=f"Failed to fetch URL: {str(e)}")
+    return HTTPException(status_code=500, detail=f"Scraping error: {str(e)}")
+
+async def scrape_batch(urls: List[str], requested: tuple, concurrency: int, no_cache: bool = False, probe: bool = False):
+    """Scrape many pages `concurrency` at a time, yielding a result or error dict per URL as each finishes"""
+    pending = iter(enumerate(urls))
+    lines = asyncio.Queue()
+    deadline = deadlines.current()
+    per_url = deadline.timeout if deadline is not None else None
+    
+    async def worker():
+        # Workers share one iterator, so each URL is taken exactly once
+        for i, url in pending:
+            if not url.startswith("http"):
+                url = f"https://{url}"
+            try:
+                # Each URL gets as long as the request would have had (no limit in background jobs)
+                with deadlines.scope(per_url):
+                    result, _ = await scrape(url, requested, no_cache, probe)
+                line = {"index": i, **result}
+            except Exception as e:
+                error = scrape_error(e)
+                line = BatchScrapeError(index=i, url=url, error=str(error.detail), status_code=error.status_code).model_dump(exclude_none=True)
+            await lines.put(line)
+    
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(urls)))]
+    try:
+        for _ in urls:
+            yield await lines.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+# Server-sent event names for each scrape section, in the order they are streamed
+SECTION_EVENTS = {"company": "meta", "social": "social", "contact": "contact", "images": "images"}
+
+def sse(event: str, data) -> bytes:
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: ".encode() + dumps(data) + b"\n\n"
+
+def section_event(section: str, scraped: dict) -> bytes:
+    """The server-sent event for one section of a ScrapeResponse dict"""
+    data = scraped[section]
+    if section == "images":
+        data = {"images": data, "image_count": scraped["image_count"], "logo_count": scraped["logo_count"]}
+    return sse(SECTION_EVENTS[section], data)
+
+async def scrape_events(url: str, requested: tuple = SCRAPE_FIELDS, no_cache: bool = False, probe: bool = False):
+    """Scrape one page as server-sent events, sending each section as soon as it is built"""
+    key = scrape_key(url, requested, probe)
+    try:
+        scraped, _, state = (None, 0, None) if no_cache else result_cache.lookup(key)
+        if state == "fresh":
+            for section in SECTION_EVENTS:
+                if section in scraped:
+                    yield section_event(section, scraped)
+            yield sse("done", scraped)
+            return
+        
+        soup, final_url = await get_soup(url, head_only=set(requested) <= set(HEAD_FIELDS), refresh=no_cache)
+        # Every event is built from the same whole-document scan as run_extractors(), so they match `done` and /api/scrape
+        nodes = await run_in_threadpool(scan_page, soup, requested)
+        extracted = {}
+        for section in SECTION_EVENTS:
+            if section in requested:
+                extracted[section] = await run_in_threadpool(build_section, section, nodes, final_url)
+                yield section_event(section, build_scrape_response(final_url, {section: extracted[section]}))
+        
+        images = extracted.get("images")
+        if probe and images:
+            for img in images:
+                img.update({"format": None, "width": None, "height": None, "bytes": None})
+            done = 0
+            async for i, info in fetcher.iter_images([img["url"] for img in images], fetch=probe_image_shared):
+                done += 1
+                images[i].update(info or {})
+                yield sse("probe", {"index": i, "url": images[i]["url"], **{k: images[i][k] for k in ("format", "width", "height", "bytes")},
+                                    "done": done, "total": len(images)})
+        
+        scraped = build_scrape_response(final_url, {section: extracted[section] for section in SCRAPE_FIELDS if section in extracted})
+        if probe and images and done < len(images):
+            scraped["truncated"] = True
+        result_cache.store(key, scraped)
+        yield sse("done", scraped)
+    
+    except Exception as e:
+        error = scrape_error(e)
+        yield sse("error", {"status_code": error.status_code, "detail": error.detail})
+
+async def image_lines(images: list, probe: bool = False):
+    """One ImageInfo dict with its `index` per image, in page order or, with `probe`, as the probes finish"""
+    if not probe:
         for i, img in enumerate(images):
-            if filter_type and img["type"] not in filter_type:
+            yield {"index": i, **pick_fields(img, IMAGE_FIELDS)}
+        return
+    
+    for img in images:
+        img.update({"format": None, "width": None, "height": None, "bytes": None})
+    pending = set(range(len(images)))
+    async for i, info in fetcher.iter_images([img["url"] for img in images], fetch=probe_image_shared):
+        pending.discard(i)
+        images[i].update(info or {})
+        yield {"index": i, **pick_fields(images[i], IMAGE_FIELDS)}
+    for i in sorted(pending):
+        yield {"index": i, **pick_fields(images[i], IMAGE_FIELDS)}
+
+async def ndjson(results):
+    """Encode an async iterator of dicts as newline-delimited JSON, closing it if the client goes away"""
+    try:
+        async for result in results:
+            yield dumps(result) + b"\n"
+    finally:
+        await results.aclose()
+
+async def download_images_to_zip(images: list, filter_type: list = None, compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+                                 max_images: Optional[int] = None, max_bytes: Optional[int] = None,
+                                 max_image_bytes: Optional[int] = None, manifest: Optional[dict] = None,
+                                 progress=None):
+    """Download images and stream them out as a ZIP archive, with a manifest.json of merged and skipped images"""
+    # Downloads start in priority order; each finished image is sent at once, and a failed one's slot goes to the next
+    selected = [(i, img) for i, img in enumerate(images) if not filter_type or img["type"] in filter_type]
+    selected.sort(key=lambda item: image_priority(item[1]))
+    archive = ZipStream(compression_level)
+    stored = {}  # content hash -> filename
+    merged = []
+    skipped = []
+    total_bytes = 0
+    dropped = {}  # url -> why its download came back empty (budget or tracking pixel)
+    downloaded = 0
+    
+    def skip(img: dict, reason: str):
+        skipped.append({"url": img["url"], "type": img["type"], "reason": reason})
+    
+    async def fetch(url: str):
+        # Cap each body at whatever is left of the archive budget when its download starts
+        limit, reason = max_image_bytes, "max_image_bytes"
+        if max_bytes is not None and (limit is None or max_bytes - total_bytes < limit):
+            limit, reason = max_bytes - total_bytes, "max_bytes"
+            if limit <= 0:
+                dropped[url] = reason
+                return None
+        try:
+            return await fetch_image_shared(url, limit)
+        except fetcher.ResponseTooLarge:
+            dropped[url] = reason
+        except fetcher.TrackingPixel:
+            dropped[url] = "tracking_pixel"
+        return None
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + deadlines.remaining(fetcher.IMAGE_DEADLINE)
+    pending = selected
+    while pending and loop.time() < deadline:
+        room = len(pending) if max_images is None else max_images - len(stored)
+        if room <= 0:
+            break
+        batch, pending = pending[:room], pending[room:]
+        finished = set()
+        
+        async for n, content in fetcher.iter_images([img["url"] for _, img in batch], deadline=deadline - loop.time(), fetch=fetch):
+            finished.add(n)
+            downloaded += 1
+            if progress:
+                await progress(downloaded, len(selected))
+            i, img = batch[n]
+            if not content:
+                skip(img, dropped.get(img["url"], "unavailable"))
                 continue
-            try:
-                r = requests.get(img["url"], timeout=10, headers=headers)
-                if r.status_code == 200 and len(r.content) > 100:
-                    ext = Path(urlparse(img["url"]).path).suffix or ".png"
-                    ext = ext.split("?")[0][:5]
-                    filename = f"{img['type']}_{i}{ext}"
-                    zf.writestr(filename, r.content)
-            except:
-                pass
-    
-    buffer.seek(0)
-    return buffer
+            ext = Path(urlparse(img["url"]).path).suffix or ".png"
+            ext = ext.split("?")[0][:5]
+            filename = f"{img['type']}_{i}{ext}"
+            digest = hashlib.sha256(content).hexdigest()
+            if digest in stored:
+                merged.append({"file": filename, "url": img["url"], "same_as": stored[digest]})
+                continue
+            if max_bytes is not None and total_bytes + len(content) > max_bytes:
+                skip(img, "max_bytes")
+                continue
+            stored[digest] = filename
+            total_bytes += len(content)
+            yield await run_in_threadpool(archive.add, filename, content)
+        
+        for n, (_, img) in enumerate(batch):
+            if n not in finished:
+                skip(img, "deadline")
+    
+    out_of_room = max_images is not None and len(stored) >= max_images
+    for _, img in pending:
+        skip(img, "max_images" if out_of_room else "deadline")
+    
+    # Also handed to the caller through `manifest`; `truncated` keeps the archive out of the cache
+    report = {key: entries for key, entries in (("merged", merged), ("skipped", skipped)) if entries}
+    if any(entry["reason"] == "deadline" for entry in skipped):
+        report["truncated"] = True
+    if manifest is not None:
+        manifest.update(report)
+    if report:
+        yield archive.add(MANIFEST_NAME, json.dumps(report, indent=2).encode())
+    yield archive.close()
+
+def archive_file_response(path: Path, filename: str) -> Response:
+    """Serve an archive file under ARCHIVE_DIR: handed to nginx with X-Accel-Redirect when deployed behind it, else from disk"""
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if archive_cache.ACCEL_REDIRECT:
+        headers["X-Accel-Redirect"] = archive_cache.ACCEL_REDIRECT_PREFIX + path.relative_to(archive_cache.ARCHIVE_DIR).as_posix()
+        return Response(media_type="application/zip", headers=headers)
+    return FileResponse(path, media_type="application/zip", headers=headers)
+
+async def archive_response(kind: str, url: str, images: list, filename: str, filter_type: list = None, **options) -> Response:
+    """Respond with the ZIP archive of a page's images, from the on-disk archive cache when possible"""
+    key = archive_cache.archive_key(kind, url, images, *(options[name] for name in sorted(options)))
+    path = await run_in_threadpool(archive_cache.store.get, key)
+    if path is not None:
+        response = archive_file_response(path, filename)
+        response.headers["Cache-Status"] = "webgrab; hit"
+        return response
+    
+    manifest = {}
+    chunks = download_images_to_zip(images, filter_type=filter_type, manifest=manifest, **options)
+    return StreamingResponse(
+        archive_cache.store.tee(key, chunks, cacheable=lambda: not manifest.get("truncated")),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}", "Cache-Status": "webgrab; fwd=uri-miss"}
+    )
+
+# ============== Contact Crawl ==============
+
+# Pages fetched per crawl by default (counting the scraped page), and the most a request may ask for
+CRAWL_PAGES = 5
+CRAWL_MAX_PAGES = env_int("WEBGRAB_CRAWL_MAX_PAGES", 20)
+CRAWL_MAX_DEPTH = 2
+
+# Crawled pages fetched at once; they are all on one site, so no more than fetcher allows per host
+CRAWL_CONCURRENCY = fetcher.CONCURRENCY_PER_HOST
+
+# Seconds a crawl may take (less if the request's deadline is sooner)
+CRAWL_DEADLINE = 20
+
+# Link paths and texts that suggest contact details, best first: contact pages, legal notices
+# (which in many countries must give an address and phone number), then about pages
+CONTACT_LINK_PATTERNS = (
+    re.compile(r"contact|kontakt|contacto|contatti|get[-_ ]in[-_ ]touch", re.I),
+    re.compile(r"impressum|imprint|legal[-_ ]notice|mentions[-_ ]legales|aviso[-_ ]legal", re.I),
+    re.compile(r"about|[uü]e?ber[-_ ]uns|qui[-_ ]sommes|quienes[-_ ]somos|chi[-_ ]siamo", re.I),
+)
+
+def parse_crawl(depth: int, max_pages: int) -> Optional[dict]:
+    """The crawl_contact() settings for `depth=`/`max_pages=`, or None when not crawling"""
+    return {"depth": depth, "max_pages": max_pages} if depth else None
+
+def same_site(url: str, base_url: str) -> bool:
+    """Whether two URLs are on the same host, ignoring a leading www."""
+    def host(u):
+        return (urlparse(u).hostname or "").lower().removeprefix("www.")
+    return host(url) == host(base_url)
+
+def find_contact_links(soup, base_url: str) -> list:
+    """Same-site links that look like contact, legal-notice or about pages, as (url, rank) best first"""
+    links = {}
+    for a in soup.find_all("a", href=True):
+        url = urldefrag(urljoin(base_url, a["href"])).url
+        if not url.startswith("http") or not same_site(url, base_url):
+            continue
+        target = f"{urlparse(url).path} {a.get_text(' ', strip=True)}"
+        for rank, pattern in enumerate(CONTACT_LINK_PATTERNS):
+            if pattern.search(target):
+                links[url] = min(rank, links.get(url, rank))
+                break
+    return sorted(links.items(), key=lambda link: link[1])
+
+def merge_contacts(pages: list) -> dict:
+    """Merge the contact info of (url, contact) pairs, best first, recording the page each value came from"""
+    merged = {"emails": [], "phones": [], "address": ""}
+    sources = {"emails": {}, "phones": {}, "address": None}
+    seen_numbers = set()
+    for url, contact in pages:
+        for email in contact["emails"]:
+            if email not in sources["emails"]:
+                merged["emails"].append(email)
+                sources["emails"][email] = url
+        for phone in contact["phones"]:
+            digits = re.sub(r"[^\d+]", "", phone["number"])
+            if digits not in seen_numbers and len(merged["phones"]) < MAX_PHONES:
+                merged["phones"].append(phone)
+                sources["phones"][phone["number"]] = url
+                seen_numbers.add(digits)
+        if not merged["address"] and contact["address"]:
+            merged["address"] = contact["address"]
+            sources["address"] = url
+    merged["sources"] = sources
+    merged["pages"] = [url for url, _ in pages]
+    return merged
+
+async def crawl_contact(soup, base_url: str, extracted: dict, crawl: dict, refresh: bool = False) -> bool:
+    """Merge the contact info of the page's same-site contact, legal-notice and about pages into `extracted`; False if time ran out"""
+    # Each level (`depth`) is fetched concurrently; pages that fail, redirect off the site or miss the budget are skipped
+    ends_at = time.monotonic() + deadlines.remaining(CRAWL_DEADLINE)
+    slots = asyncio.Semaphore(CRAWL_CONCURRENCY)
+    pages = [(base_url, extracted["contact"])]
+    visited = {canonical_url(base_url)}
+    read = {canonical_url(base_url)}
+    frontier = [(soup, base_url)]
+    complete = True
+    
+    async def visit(url: str):
+        async with slots:
+            page_soup, final_url = await get_soup(url, refresh=refresh)
+        page_contact = (await run_in_threadpool(run_extractors, page_soup, final_url, ("contact",)))["contact"]
+        return page_soup, final_url, page_contact
+    
+    for _ in range(crawl["depth"]):
+        found = []
+        for page_soup, page_url in frontier:
+            found += await run_in_threadpool(find_contact_links, page_soup, page_url)
+        links = []
+        for url, _ in sorted(found, key=lambda link: link[1]):
+            if len(visited) >= crawl["max_pages"]:
+                break
+            if canonical_url(url) not in visited:
+                visited.add(canonical_url(url))
+                links.append(url)
+        if not links:
+            break
+        
+        tasks = [asyncio.create_task(visit(url)) for url in links]
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=max(ends_at - time.monotonic(), 0))
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        complete = complete and not pending
+        
+        # Merge in link order, so contact pages take precedence over about pages
+        frontier = []
+        for task in tasks:
+            if task in pending or task.cancelled() or task.exception() is not None:
+                continue
+            page_soup, final_url, page_contact = task.result()
+            if same_site(final_url, base_url) and canonical_url(final_url) not in read:
+                read.add(canonical_url(final_url))
+                pages.append((final_url, page_contact))
+                frontier.append((page_soup, final_url))
+    
+    extracted["contact"] = merge_contacts(pages)
+    return complete
+
+# ============== Background Jobs ==============
+
+async def run_scrape_job(job: dict, progress):
+    params = job["params"]
+    try:
+        result, _ = await scrape(params["url"], parse_fields(params["fields"]), params["no_cache"], params["probe"])
+    except Exception as e:
+        raise scrape_error(e)
+    await progress(1, 1)
+    return result
+
+async def run_batch_job(job: dict, progress):
+    params = job["params"]
+    results = []
+    async for result in scrape_batch(params["urls"], parse_fields(params["fields"]), params["concurrency"],
+                                     params["no_cache"], params["probe"]):
+        results.append(result)
+        await progress(len(results), len(params["urls"]))
+    return sorted(results, key=lambda result: result["index"])
+
+async def run_archive_job(job: dict, progress):
+    """Build an images or icons archive into the job's archive file"""
+    params = job["params"]
+    final_url, images = await get_page_images(params["url"])
+    filter_type = ["logo", "favicon"] if job["kind"] == "icons" else None
+    if not any(not filter_type or img["type"] in filter_type for img in images):
+        raise HTTPException(status_code=404, detail="No logos or favicons found" if filter_type else "No images found on this page")
+    
+    manifest = {}
+    chunks = download_images_to_zip(
+        images, filter_type=filter_type, compression_level=params["compression_level"], max_images=params["max_images"],
+        max_bytes=params["max_bytes"], max_image_bytes=params["max_image_bytes"], manifest=manifest, progress=progress
+    )
+    async for _ in archive_cache.tee_to_file(jobs.archive_path(job["id"]), chunks):
+        pass
+    
+    domain = urlparse(final_url).netloc.replace("www.", "")
+    return {"url": final_url, "filename": f"{domain}_{job['kind']}.zip", "manifest": manifest}
+
+job_workers = jobs.JobWorkers(jobs.store, {
+    "scrape": run_scrape_job,
+    "batch": run_batch_job,
+    "images": run_archive_job,
+    "icons": run_archive_job,
+})
+
+def job_status(request: Request, job: dict) -> JobStatus:
+    """JobStatus for a stored job, with a download link once its archive is ready"""
+    archive_url = None
+    if job["status"] == jobs.DONE and job["kind"] in ("images", "icons"):
+        archive_url = str(request.url_for("download_job_archive", job_id=job["id"]))
+    return JobStatus(
+        id=job["id"],
+        kind=job["kind"],
+        status=job["status"],
+        progress=JobProgress(done=job["done"], total=job["total"]),
+        result=job["result"],
+        error=job["error"],
+        archive_url=archive_url,
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+    )
 
 # ============== API Endpoints ==============
 
@@ -265,16 +1103,40 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/stats", tags=["Info"])
+async def stats():
+    """Runtime statistics for this worker (admission control, connection pool reuse, result cache, page snapshots, coalesced requests, cached archives, jobs, shared state)"""
+    return {
+        "admission": admission_limiter.stats(),
+        "pool": fetcher.pool_stats(),
+        "cache": result_cache.stats(),
+        "singleflight": flights.stats(),
+        "snapshots": await run_in_threadpool(snapshots.store.stats),
+        "archives": await run_in_threadpool(archive_cache.store.stats),
+        "jobs": {"queue": await run_in_threadpool(jobs.store.stats), "workers": job_workers.stats()},
+        "shared": await run_in_threadpool(sharedstore.store.stats) if sharedstore.store else {"enabled": False},
+    }
+
 @app.get(
     "/api/scrape",
+    dependencies=[Depends(request_timeout)],
     response_model=ScrapeResponse,
-    responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}},
+    response_model_exclude_unset=True,
+    responses={400: {"model": ErrorResponse}, 413: {"model": ErrorResponse}, 415: {"model": ErrorResponse}, 500: {"model": ErrorResponse}},
     tags=["Scraping"],
     summary="Scrape website data",
     description="Extract company info, contact details, social links, and image URLs from a website."
 )
 async def scrape_website(
-    url: str = Query(..., description="The website URL to scrape (e.g., https://example.com)")
+    url: str = Query(..., description="The website URL to scrape (e.g., https://example.com)"),
+    fields: Optional[str] = Query(None, description="Comma-separated sections to return: company, contact, social, images (default: all)"),
+    no_cache: bool = Query(False, description="Skip the result and snapshot caches and fetch the page again"),
+    probe: bool = Query(False, description="Read the first few KB of each image to report its format, dimensions and size"),
+    images_type: Optional[str] = Query(None, description="Comma-separated image types to list: favicon, logo, image (default: all)"),
+    images_limit: Optional[int] = Query(None, ge=1, description="Return at most this many images, with `images_next_cursor` for the rest"),
+    images_cursor: Optional[str] = Query(None, description="`images_next_cursor` of the previous page"),
+    depth: int = Query(0, ge=0, le=CRAWL_MAX_DEPTH, description="Also follow the site's contact, legal-notice and about links this many levels deep for contact info"),
+    max_pages: int = Query(CRAWL_PAGES, ge=1, le=CRAWL_MAX_PAGES, description="Most pages read for contact info with `depth`, including this one")
 ):
     """
     Scrape a website and extract all available information.
@@ -286,173 +1148,359 @@ async def scrape_website(
     - **images**: List of all images with type (favicon/logo/image) and URLs
     """
     try:
+        requested = parse_fields(fields)
+        image_query = parse_image_query(images_type, images_limit, images_cursor)
+        
         # Ensure URL has protocol
         if not url.startswith("http"):
             url = f"https://{url}"
         
-        soup, final_url = get_soup(url)
-        text = soup.get_text()
-        
-        meta = extract_meta(soup)
-        contact = extract_contact(soup, text)
-        social = extract_social(soup, final_url)
-        images = extract_images(soup, final_url)
-        
-        logos = [img for img in images if img["type"] in ["logo", "favicon"]]
-        
-        return ScrapeResponse(
-            success=True,
-            url=final_url,
-            company=CompanyInfo(
-                name=meta.get("company_name"),
-                description=meta.get("description"),
-                keywords=meta.get("keywords"),
-                title=meta.get("title")
-            ),
-            contact=ContactInfo(
-                emails=contact["emails"],
-                phones=[PhoneNumber(**p) for p in contact["phones"]],
-                address=contact["address"] or None
-            ),
-            social=SocialMedia(**social),
-            images=[ImageInfo(**img) for img in images],
-            image_count=len(images),
-            logo_count=len(logos)
-        )
+        result, status = await scrape(url, requested, no_cache, probe, image_query, parse_crawl(depth, max_pages))
+        # Returned as-is: the result already has the ScrapeResponse shape, so FastAPI's re-validation is skipped
+        return FastJSONResponse(result, headers={"Cache-Status": status})
     
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=400, detail=f"Failed to fetch URL: {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Scraping error: {str(e)}")
+        raise scrape_error(e)
+
+@app.get(
+    "/api/scrape/stream",
+    dependencies=[Depends(request_timeout)],
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}, "description": "Server-sent events: meta, social, contact, images, probe, then done or error"},
+               400: {"model": ErrorResponse}},
+    tags=["Scraping"],
+    summary="Stream scrape results as they are extracted",
+    description="Server-sent events variant of /api/scrape that sends each section as soon as it is ready."
+)
+async def scrape_website_stream(
+    url: str = Query(..., description="The website URL to scrape (e.g., https://example.com)"),
+    fields: Optional[str] = Query(None, description="Comma-separated sections to return: company, contact, social, images (default: all)"),
+    no_cache: bool = Query(False, description="Skip the result and snapshot caches and fetch the page again"),
+    probe: bool = Query(False, description="Probe each image for its format, dimensions and size, with a `probe` event per image")
+):
+    """Scrape a website, streaming each section as a server-sent event"""
+    requested = parse_fields(fields)
+    if not url.startswith("http"):
+        url = f"https://{url}"
+    return StreamingResponse(
+        scrape_events(url, requested, no_cache, probe),
+        media_type="text/event-stream",
+        # Tell nginx not to buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get(
+    "/api/scrape/images",
+    dependencies=[Depends(request_timeout)],
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}, "description": "One ImageInfo JSON object, with its `index`, per line"},
+               400: {"model": ErrorResponse}, 404: {"model": ErrorResponse}},
+    tags=["Scraping"],
+    summary="Stream a page's image list",
+    description="Stream every image on a page as newline-delimited JSON instead of one large response."
+)
+async def scrape_website_images(
+    url: str = Query(..., description="The website URL to scrape (e.g., https://example.com)"),
+    images_type: Optional[str] = Query(None, description="Comma-separated image types to list: favicon, logo, image (default: all)"),
+    no_cache: bool = Query(False, description="Skip the snapshot cache and fetch the page again"),
+    probe: bool = Query(False, description="Probe each image for its format, dimensions and size")
+):
+    """List all images on a page as newline-delimited JSON, one ImageInfo with its `index` per line"""
+    try:
+        types = parse_image_types(images_type)
+        if not url.startswith("http"):
+            url = f"https://{url}"
+        soup, final_url = await get_soup(url, refresh=no_cache)
+        images = await run_in_threadpool(extract_images, soup, final_url, types)
+    except Exception as e:
+        raise scrape_error(e)
+    return StreamingResponse(ndjson(image_lines(images, probe)), media_type="application/x-ndjson")
+
+@app.post(
+    "/api/scrape/batch",
+    dependencies=[Depends(request_timeout)],
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"application/x-ndjson": {}}, "description": "One ScrapeResponse or BatchScrapeError JSON object per line"},
+        400: {"model": ErrorResponse},
+    },
+    tags=["Scraping"],
+    summary="Scrape many websites",
+    description="Scrape a list of URLs concurrently, streaming one NDJSON result per URL as it finishes."
+)
+async def scrape_websites(request: BatchScrapeRequest):
+    """Scrape every URL in `urls`, streaming one NDJSON line per URL as it finishes"""
+    requested = parse_fields(request.fields)
+    results = scrape_batch(request.urls, requested, request.concurrency, request.no_cache, request.probe)
+    return StreamingResponse(ndjson(results), media_type="application/x-ndjson")
 
 @app.get(
     "/api/images",
+    dependencies=[Depends(request_timeout)],
     tags=["Downloads"],
     summary="Download all images as ZIP",
     description="Download all images from a website as a ZIP archive."
 )
 async def download_all_images(
-    url: str = Query(..., description="The website URL to scrape")
+    url: str = Query(..., description="The website URL to scrape"),
+    compression_level: int = Query(DEFAULT_COMPRESSION_LEVEL, ge=0, le=9, description="Deflate level for non-compressed formats such as SVG/ICO (0 stores everything)"),
+    max_images: Optional[int] = Query(None, ge=1, description="Most images to put in the archive (favicons and logos first, then the largest images)"),
+    max_bytes: Optional[int] = Query(None, ge=1, description="Most bytes of image data in the archive"),
+    max_image_bytes: Optional[int] = Query(None, ge=1, description="Skip any single image larger than this many bytes")
 ):
     """Download all images from a website as a ZIP file"""
     try:
         if not url.startswith("http"):
             url = f"https://{url}"
         
-        soup, final_url = get_soup(url)
-        images = extract_images(soup, final_url)
+        final_url, images = await get_page_images(url)
         
         if not images:
             raise HTTPException(status_code=404, detail="No images found on this page")
         
         domain = urlparse(final_url).netloc.replace("www.", "")
-        zip_buffer = download_images_to_zip(images)
-        
-        return StreamingResponse(
-            zip_buffer,
-            media_type="application/zip",
-            headers={"Content-Disposition": f"attachment; filename={domain}_images.zip"}
+        return await archive_response(
+            "images", url, images, f"{domain}_images.zip",
+            compression_level=compression_level, max_images=max_images, max_bytes=max_bytes, max_image_bytes=max_image_bytes
         )
     
     except HTTPException:
         raise
     except Exception as e:
+        if isinstance(e, deadlines.DeadlineExceeded) or deadlines.expired():
+            raise deadline_error()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get(
     "/api/icons",
+    dependencies=[Depends(request_timeout)],
     tags=["Downloads"],
     summary="Download logos and favicons as ZIP",
     description="Download only logos and favicons from a website as a ZIP archive."
 )
 async def download_icons(
-    url: str = Query(..., description="The website URL to scrape")
+    url: str = Query(..., description="The website URL to scrape"),
+    compression_level: int = Query(DEFAULT_COMPRESSION_LEVEL, ge=0, le=9, description="Deflate level for non-compressed formats such as SVG/ICO (0 stores everything)"),
+    max_images: Optional[int] = Query(None, ge=1, description="Most images to put in the archive (favicons and logos first, then the largest images)"),
+    max_bytes: Optional[int] = Query(None, ge=1, description="Most bytes of image data in the archive"),
+    max_image_bytes: Optional[int] = Query(None, ge=1, description="Skip any single image larger than this many bytes")
 ):
     """Download logos and favicons as a ZIP file"""
     try:
         if not url.startswith("http"):
             url = f"https://{url}"
         
-        soup, final_url = get_soup(url)
-        images = extract_images(soup, final_url)
+        final_url, images = await get_page_images(url)
         
         icons = [img for img in images if img["type"] in ["logo", "favicon"]]
         if not icons:
             raise HTTPException(status_code=404, detail="No logos or favicons found")
         
         domain = urlparse(final_url).netloc.replace("www.", "")
-        zip_buffer = download_images_to_zip(images, filter_type=["logo", "favicon"])
-        
-        return StreamingResponse(
-            zip_buffer,
-            media_type="application/zip",
-            headers={"Content-Disposition": f"attachment; filename={domain}_icons.zip"}
+        return await archive_response(
+            "icons", url, images, f"{domain}_icons.zip", filter_type=["logo", "favicon"],
+            compression_level=compression_level, max_images=max_images, max_bytes=max_bytes, max_image_bytes=max_image_bytes
         )
     
     except HTTPException:
         raise
     except Exception as e:
+        if isinstance(e, deadlines.DeadlineExceeded) or deadlines.expired():
+            raise deadline_error()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get(
     "/api/contact",
+    dependencies=[Depends(request_timeout)],
     tags=["Scraping"],
     summary="Extract contact info only",
     description="Quick endpoint to extract just emails and phone numbers."
 )
 async def get_contact_only(
-    url: str = Query(..., description="The website URL to scrape")
+    response: Response,
+    url: str = Query(..., description="The website URL to scrape"),
+    no_cache: bool = Query(False, description="Skip the result and snapshot caches and fetch the page again"),
+    depth: int = Query(0, ge=0, le=CRAWL_MAX_DEPTH, description="Also follow the site's contact, legal-notice and about links this many levels deep"),
+    max_pages: int = Query(CRAWL_PAGES, ge=1, le=CRAWL_MAX_PAGES, description="Most pages read with `depth`, including this one")
 ):
     """Extract only contact information (emails and phones)"""
     try:
         if not url.startswith("http"):
             url = f"https://{url}"
+        crawl = parse_crawl(depth, max_pages)
         
-        soup, final_url = get_soup(url)
-        text = soup.get_text()
-        contact = extract_contact(soup, text)
+        async def compute():
+            soup, final_url = await get_soup(url, refresh=no_cache)
+            extracted = await run_in_threadpool(run_extractors, soup, final_url, ("contact",))
+            complete = crawl is None or await crawl_contact(soup, final_url, extracted, crawl, no_cache)
+            contact = extracted["contact"]
+            
+            result = {
+                "success": True,
+                "url": final_url,
+                "emails": contact["emails"],
+                "phones": contact["phones"],
+                "address": contact["address"] or None
+            }
+            if crawl is not None:
+                result["sources"] = contact["sources"]
+                result["pages"] = contact["pages"]
+            if not complete:
+                result["truncated"] = True
+            return result
         
-        return {
-            "success": True,
-            "url": final_url,
-            "emails": contact["emails"],
-            "phones": contact["phones"],
-            "address": contact["address"] or None
-        }
+        key = cache_key("contact", url) if crawl is None else cache_key("contact", url, f"crawl={depth}/{max_pages}")
+        return await cached(response, key, compute, no_cache, partial=crawl is not None)
     
+    except HTTPException:
+        raise
     except Exception as e:
+        if isinstance(e, deadlines.DeadlineExceeded) or deadlines.expired():
+            raise deadline_error()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get(
     "/api/social",
+    dependencies=[Depends(request_timeout)],
     tags=["Scraping"],
     summary="Extract social media links only",
     description="Quick endpoint to extract just social media profile links."
 )
 async def get_social_only(
-    url: str = Query(..., description="The website URL to scrape")
+    response: Response,
+    url: str = Query(..., description="The website URL to scrape"),
+    no_cache: bool = Query(False, description="Skip the result and snapshot caches and fetch the page again")
 ):
     """Extract only social media links"""
     try:
         if not url.startswith("http"):
             url = f"https://{url}"
         
-        soup, final_url = get_soup(url)
-        social = extract_social(soup, final_url)
+        async def compute():
+            soup, final_url = await get_soup(url, refresh=no_cache)
+            social = (await run_in_threadpool(run_extractors, soup, final_url, ("social",)))["social"]
+            
+            # Filter out empty values
+            found_social = {k: v for k, v in social.items() if v}
+            
+            return {
+                "success": True,
+                "url": final_url,
+                "social": found_social,
+                "count": len(found_social)
+            }
         
-        # Filter out empty values
-        found_social = {k: v for k, v in social.items() if v}
+        return await cached(response, cache_key("social", url), compute, no_cache)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        if isinstance(e, deadlines.DeadlineExceeded) or deadlines.expired():
+            raise deadline_error()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get(
+    "/api/meta",
+    dependencies=[Depends(request_timeout)],
+    tags=["Scraping"],
+    summary="Extract page metadata and favicons only",
+    description="Fast endpoint that reads only the page's <head> to return company/meta info and favicon URLs."
+)
+async def get_meta_only(
+    url: str = Query(..., description="The website URL to scrape")
+):
+    """Extract only company/meta information and favicons (stops reading at </head>)"""
+    try:
+        if not url.startswith("http"):
+            url = f"https://{url}"
+        
+        soup, final_url = await get_soup(url, head_only=True)
+        extracted = await run_in_threadpool(run_extractors, soup, final_url, ("company", "images"))
+        meta = extracted["company"]
+        icons = [pick_fields(img, IMAGE_FIELDS) for img in extracted["images"] if img["type"] == "favicon"]
         
         return {
             "success": True,
             "url": final_url,
-            "social": found_social,
-            "count": len(found_social)
+            "company": {
+                "name": meta.get("company_name"),
+                "description": meta.get("description"),
+                "keywords": meta.get("keywords"),
+                "title": meta.get("title")
+            },
+            "icons": icons,
+            "icon_count": len(icons)
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
+        if isinstance(e, deadlines.DeadlineExceeded) or deadlines.expired():
+            raise deadline_error()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post(
+    "/api/jobs",
+    status_code=202,
+    response_model=JobStatus,
+    responses={400: {"model": ErrorResponse}},
+    tags=["Jobs"],
+    summary="Submit a background job",
+    description="Queue a scrape, batch or archive to run in the background and poll for the result."
+)
+async def submit_job(request: Request, response: Response, job: JobRequest):
+    """Queue a job and return its id immediately"""
+    params = job.model_dump(exclude={"kind"})
+    if job.kind == "batch":
+        if not job.urls:
+            raise HTTPException(status_code=400, detail="Batch jobs need `urls`")
+    else:
+        if not job.url:
+            raise HTTPException(status_code=400, detail=f"{job.kind.capitalize()} jobs need `url`")
+        if not job.url.startswith("http"):
+            params["url"] = f"https://{job.url}"
+    if job.kind in ("scrape", "batch"):
+        parse_fields(job.fields)
+    
+    job_id = await run_in_threadpool(jobs.store.submit, job.kind, params)
+    job_workers.notify()
+    await run_in_threadpool(jobs.store.prune)
+    
+    response.headers["Location"] = str(request.url_for("get_job", job_id=job_id))
+    return job_status(request, await run_in_threadpool(jobs.store.get, job_id))
+
+@app.get(
+    "/api/jobs/{job_id}",
+    response_model=JobStatus,
+    responses={404: {"model": ErrorResponse}},
+    tags=["Jobs"],
+    summary="Get job status and result"
+)
+async def get_job(request: Request, job_id: str):
+    """Status, progress and (once done) the result or archive link of a job"""
+    job = await run_in_threadpool(jobs.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (it may have expired)")
+    return job_status(request, job)
+
+@app.get(
+    "/api/jobs/{job_id}/archive",
+    responses={404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}},
+    tags=["Jobs"],
+    summary="Download a job's archive"
+)
+async def download_job_archive(job_id: str):
+    """Download the ZIP archive built by a finished images or icons job"""
+    job = await run_in_threadpool(jobs.store.get, job_id)
+    if job is None or job["kind"] not in ("images", "icons"):
+        raise HTTPException(status_code=404, detail="Archive job not found (it may have expired)")
+    if job["status"] != jobs.DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, the archive is not ready")
+    path = jobs.archive_path(job_id)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Archive file is no longer available")
+    return archive_file_response(path, job["result"]["filename"])
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -6,16 +6,19 @@ except ImportError:
     pass
 
 import streamlit as st
-import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 import pandas as pd
 import re
 import os
+import hashlib
 import io
 import zipfile
 from pathlib import Path
 
+import archive
+import fetcher
+
 st.set_page_config(page_title="Web Grab & Capture", page_icon="globe", layout="wide")
 
 # Modern professional dark theme CSS
@@ -244,9 +247,9 @@ st.markdown('<p class="data-label">Enter Website URL</p>', unsafe_allow_html=Tru
 url = st.text_input("Website URL", placeholder="https://example.com", label_visibility="collapsed")
 
 def get_soup(url):
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
-    response = requests.get(url, headers=headers, timeout=15)
-    return BeautifulSoup(response.content, "lxml"), response.url
+    # Goes through the shared keep-alive pool, same as the image downloads below
+    content, final_url = fetcher.run_sync(fetcher.fetch_page(url, check_status=False))
+    return BeautifulSoup(content, "lxml"), final_url
 
 def extract_meta(soup):
     meta = {}
@@ -334,29 +337,39 @@ def extract_images(soup, base_url):
 def download_images(images, folder):
     Path(folder).mkdir(parents=True, exist_ok=True)
     downloaded = []
+    # Each URL is fetched once, even if the page references it several times
+    unique_urls = list(dict.fromkeys(img["url"] for img in images))
+    # Fetch concurrently (capped globally and per origin), results come back in page order
+    fetched = dict(zip(unique_urls, fetcher.run_sync(fetcher.fetch_images(unique_urls))))
+    seen_urls, seen_hashes = set(), set()
     for i, img in enumerate(images):
+        content = fetched.get(img["url"])
+        if not content or img["url"] in seen_urls: continue
+        seen_urls.add(img["url"])
+        # Same bytes under a different URL: keep only the first copy
+        digest = hashlib.sha256(content).hexdigest()
+        if digest in seen_hashes: continue
+        seen_hashes.add(digest)
         try:
             ext = Path(urlparse(img["url"]).path).suffix or ".png"
             ext = ext.split("?")[0][:5]  # Clean extension
             filename = f"{img['type']}_{i}{ext}"
             filepath = os.path.join(folder, filename)
-            r = requests.get(img["url"], timeout=10, headers={"User-Agent": "Mozilla/5.0"})
-            if r.status_code == 200 and len(r.content) > 100:
-                with open(filepath, "wb") as f: f.write(r.content)
-                downloaded.append({**img, "local_path": filepath, "content": r.content})
+            with open(filepath, "wb") as f: f.write(content)
+            downloaded.append({**img, "local_path": filepath, "content": content})
         except: pass
     return downloaded
 
 def create_zip(images, filter_type=None):
-    """Create a zip file from downloaded images"""
+    """Create a zip file from downloaded images (already-compressed formats are stored, not deflated)"""
     buffer = io.BytesIO()
-    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+    with zipfile.ZipFile(buffer, "w") as zf:
         for img in images:
             if filter_type and img["type"] not in filter_type:
                 continue
             if "content" in img:
                 filename = Path(img["local_path"]).name
-                zf.writestr(filename, img["content"])
+                zf.writestr(filename, img["content"], compress_type=archive.compression_for(img["content"]))
     buffer.seek(0)
     return buffer
 
@@ -0,0 +1,78 @@
+"""
+Web Grab & Capture - Streaming ZIP Archives
+============================================
+ZipStream builds a ZIP archive incrementally and hands back the bytes for
+each entry as soon as it is written, so an HTTP response can start
+sending the archive before every image has been downloaded.
+
+The archive is written to a sink that cannot seek, which makes zipfile
+emit data descriptors after each entry instead of patching the local
+headers afterwards. Only the entry being written (plus the small central
+directory) is held in memory at any time.
+
+Compression is chosen per entry: formats that are already compressed
+(JPEG, PNG, GIF, WebP, ...) are stored as-is, everything else (SVG, ICO,
+BMP, unknown) is deflated. zipfile only gained Zstandard in Python 3.14
+and many unzip tools can't read it, so deflate is the only codec used.
+"""
+
+import zipfile
+
+from imageinfo import is_compressed
+
+DEFAULT_COMPRESSION_LEVEL = 6
+
+# Entry describing what was left out of an archive and why
+MANIFEST_NAME = "manifest.json"
+
+def compression_for(content: bytes, level: int = DEFAULT_COMPRESSION_LEVEL) -> int:
+    """ZIP compression method for one entry: stored for already-compressed images or level 0, else deflate"""
+    if level == 0 or is_compressed(content):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+# ============== Sink ==============
+
+class _Sink:
+    """Write-only, non-seekable buffer that is emptied every time it is drained"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+# ============== Writer ==============
+
+class ZipStream:
+    """ZIP writer that returns the bytes of each entry as it is added"""
+
+    def __init__(self, compresslevel: int = DEFAULT_COMPRESSION_LEVEL):
+        self.compresslevel = compresslevel
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w")
+
+    def add(self, filename: str, content: bytes) -> bytes:
+        """Write one entry (compression picked from its format) and return the archive bytes it produced"""
+        self._zip.writestr(filename, content, compress_type=compression_for(content, self.compresslevel),
+                           compresslevel=self.compresslevel)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        """Finish the archive and return the remaining bytes (the central directory)"""
+        self._zip.close()
+        return self._sink.drain()
@@ -0,0 +1,158 @@
+"""
+Web Grab & Capture - Archive Cache
+===================================
+Generated ZIP archives are kept on disk so repeated /api/images and
+/api/icons calls for the same page are served as files instead of being
+rebuilt. Archives are keyed by the canonical page URL, a hash of the page's
+image set and the archive options, so a page whose images changed gets a
+new archive.
+
+An archive is written to a temporary file while it streams to the first
+client and only renamed into place once it is complete, so a cancelled or
+failed download never leaves a truncated archive behind. Archives expire
+ARCHIVE_TTL seconds after they were written and the oldest are removed
+while the directory is over ARCHIVE_MAX_BYTES.
+
+Behind nginx, cache hits are handed to nginx with X-Accel-Redirect (see
+nginx-webgrab.conf) so it serves the file with sendfile and Range support
+and the Python worker is freed immediately.
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+from cache import cache_key
+from settings import DATA_DIR, env_bool, env_int
+
+# ============== Settings ==============
+
+ARCHIVE_DIR = DATA_DIR / "archives"
+ARCHIVE_TTL = env_int("WEBGRAB_ARCHIVE_TTL", 3600)
+ARCHIVE_MAX_BYTES = env_int("WEBGRAB_ARCHIVE_MAX_BYTES", 1024 * 1024 * 1024)
+
+# Hand cache hits to nginx, which maps this internal location onto ARCHIVE_DIR
+ACCEL_REDIRECT = env_bool("WEBGRAB_ACCEL_REDIRECT", False)
+ACCEL_REDIRECT_PREFIX = os.environ.get("WEBGRAB_ACCEL_REDIRECT_PREFIX", "/webgrab-archives/")
+
+def archive_key(kind: str, url: str, images: list, *options) -> str:
+    """Cache key for an archive: endpoint, canonical URL, a hash of the image set and the options that shape the ZIP"""
+    image_set = hashlib.sha256("\n".join(f"{img['type']} {img['url']}" for img in images).encode()).hexdigest()
+    return hashlib.sha256(cache_key(kind, url, image_set, *options).encode()).hexdigest()
+
+# ============== Files ==============
+
+async def tee_to_file(path: Path, chunks, keep=lambda: True):
+    """
+    Pass a byte stream through while writing it to `path`.
+
+    Chunks go to a temporary file next to `path`, which is moved into place
+    only after the last chunk and only if `keep()` agrees; otherwise, or if
+    the stream is abandoned, the partial file is deleted. If the directory
+    isn't writable the stream is passed through without being saved.
+    """
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        file = os.fdopen(fd, "wb")
+    except OSError:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    try:
+        async for chunk in chunks:
+            await asyncio.to_thread(file.write, chunk)
+            yield chunk
+        file.close()
+        if keep():
+            os.chmod(tmp_name, 0o644)  # mkstemp files are private; nginx has to read these
+            os.replace(tmp_name, path)
+    finally:
+        file.close()
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+
+# ============== Store ==============
+
+class ArchiveCache:
+    """Finished ZIP archives on disk, one file per key"""
+
+    def __init__(self, directory: Path = ARCHIVE_DIR, ttl: int = ARCHIVE_TTL, max_bytes: int = ARCHIVE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "discarded": 0, "evictions": 0}
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.zip"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Path of a fresh archive for `key`, or None"""
+        path = self.path(key)
+        try:
+            fresh = time.time() - path.stat().st_mtime <= self.ttl
+        except OSError:
+            fresh = False
+        self._stats["hits" if fresh else "misses"] += 1
+        return path if fresh else None
+
+    async def tee(self, key: str, chunks, cacheable=lambda: True):
+        """
+        Pass an archive stream through while writing it to the cache.
+
+        The archive is kept only if the stream completes and `cacheable()`
+        still agrees at that point (e.g. no image missed the deadline).
+        """
+        def keep() -> bool:
+            kept = cacheable()
+            self._stats["writes" if kept else "discarded"] += 1
+            return kept
+
+        async for chunk in tee_to_file(self.path(key), chunks, keep):
+            yield chunk
+        await asyncio.to_thread(self._evict)
+
+    def _evict(self):
+        """Remove expired archives, then the oldest ones while over quota"""
+        now = time.time()
+        entries = []
+        for path in self.directory.glob("*.zip"):
+            try:
+                stat = path.stat()
+                if now - stat.st_mtime > self.ttl:
+                    path.unlink()
+                    self._stats["evictions"] += 1
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                pass
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+                self._stats["evictions"] += 1
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process and the archive directory's size"""
+        files = list(self.directory.glob("*.zip")) if self.directory.exists() else []
+        stored = 0
+        for path in files:
+            try:
+                stored += path.stat().st_size
+            except OSError:
+                pass
+        return {**self._stats, "entries": len(files), "bytes": stored, "ttl": self.ttl,
+                "max_bytes": self.max_bytes, "accel_redirect": ACCEL_REDIRECT}
+
+# Shared by the archive endpoints
+store = ArchiveCache()
@@ -0,0 +1,222 @@
+"""
+Web Grab & Capture - Benchmarks
+================================
+Micro-benchmarks for the hot paths of the API, run against synthetic pages
+so results don't depend on the network.
+
+Run with: python bench.py extract [--sections 2000] [--repeat 5]
+          python bench.py zip [--images 80] [--repeat 5]
+          python bench.py serialize [--sections 5000] [--repeat 5]
+"""
+
+import argparse
+import io
+import os
+import random
+import struct
+import time
+import zipfile
+import zlib
+
+from bs4 import BeautifulSoup
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+import api
+import fastjson
+from archive import ZipStream
+
+# ============== Synthetic Pages ==============
+
+def make_page(sections: int) -> str:
+    """Build a large, realistic-looking page with links, images, contact details and noise"""
+    parts = [
+        "<html><head><title>Acme Corp | Home</title>",
+        '<meta name="description" content="We make things"><meta property="og:site_name" content="Acme">',
+        '<link rel="icon" href="/favicon.ico"><link rel="apple-touch-icon" href="/touch.png">',
+        "<script>var tracking = 'call home';</script></head><body>",
+        '<header><img src="/logo.svg" class="site-logo" alt="Acme"></header>',
+    ]
+    for i in range(sections):
+        parts.append(
+            f'<section class="block-{i}"><h2>Section {i}</h2>'
+            f"<p>Lorem ipsum dolor sit amet, item {i}. Reach us at team{i % 7}@acme.test.</p>"
+            f'<ul><li><a href="/page/{i}">Page {i}</a></li><li><a href="https://cdn.acme.test/{i}">CDN</a></li></ul>'
+            f'<img src="/img/{i}.jpg" alt="Product {i}" width="400" height="300">'
+            f"<!-- section {i} -->"
+            f'{"<p>Phone: +1 555 010 %04d</p>" % i if i % 50 == 0 else ""}'
+            "</section>"
+        )
+    parts.append(
+        '<footer><div class="contact-info"><span>Sales: <a href="tel:+15550100">+1 555 0100</a></span></div>'
+        '<a href="https://www.linkedin.com/company/acme">LinkedIn</a><a href="https://x.com/acme">X</a>'
+        "</footer></body></html>"
+    )
+    return "".join(parts)
+
+def make_png(width: int, height: int) -> bytes:
+    """A valid PNG filled with noise, so its IDAT data is as incompressible as a real photo"""
+    raw = b"".join(b"\x00" + os.urandom(width * 3) for _ in range(height))
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+def make_images(count: int) -> list:
+    """A typical page's image mix: mostly JPEG/PNG photos, some SVG logos and ICO favicons"""
+    rng = random.Random(42)
+    images = []
+    for i in range(count):
+        kind = rng.choices(["jpg", "png", "svg", "ico"], weights=[55, 30, 10, 5])[0]
+        if kind == "jpg":
+            data = b"\xff\xd8\xff\xe0" + os.urandom(rng.randint(40_000, 250_000))
+        elif kind == "png":
+            data = make_png(rng.randint(80, 200), rng.randint(80, 200))
+        elif kind == "svg":
+            data = ('<svg xmlns="http://www.w3.org/2000/svg">' + '<path d="M0 0L10 10"/>' * rng.randint(200, 2000) + "</svg>").encode()
+        else:
+            data = b"\x00\x00\x01\x00" + bytes(rng.randint(1_000, 20_000))
+        images.append((f"image_{i}.{kind}", data))
+    return images
+
+# ============== Benchmarks ==============
+
+def multi_pass(soup, base_url: str) -> dict:
+    """The per-extractor pipeline: one tree traversal per extractor plus get_text()"""
+    text = soup.get_text()
+    return {
+        "company": api.extract_meta(soup),
+        "contact": api.extract_contact(soup, text),
+        "social": api.extract_social(soup, base_url),
+        "images": api.extract_images(soup, base_url),
+    }
+
+def best_of(fn, repeat: int) -> float:
+    """Best wall time of `repeat` runs, in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+def bench_extract(sections: int, repeat: int):
+    """Compare multi-pass extraction against the single-pass scan"""
+    base_url = "https://acme.test/"
+    html = make_page(sections)
+    soup = BeautifulSoup(html, "lxml")
+
+    expected = multi_pass(soup, base_url)
+    actual = api.run_extractors(soup, base_url)
+    assert actual == expected, "single-pass extraction output differs from multi-pass"
+
+    multi_ms = best_of(lambda: multi_pass(soup, base_url), repeat)
+    single_ms = best_of(lambda: api.run_extractors(soup, base_url), repeat)
+
+    print(f"page: {len(html) / 1024:.0f} KB, {sections} sections, {len(expected['images'])} images")
+    print(f"multi-pass:  {multi_ms:8.1f} ms")
+    print(f"single-pass: {single_ms:8.1f} ms")
+    print(f"speedup:     {multi_ms / single_ms:8.2f}x")
+
+def deflate_all(images: list) -> int:
+    """Archive every entry with ZIP_DEFLATED, as the endpoints used to; returns archive size"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for filename, content in images:
+            zf.writestr(filename, content)
+    return buffer.tell()
+
+def format_aware(images: list) -> int:
+    """Archive with per-entry compression selection; returns archive size"""
+    archive = ZipStream()
+    size = sum(len(archive.add(filename, content)) for filename, content in images)
+    return size + len(archive.close())
+
+def cpu_best_of(fn, repeat: int):
+    """Best CPU time of `repeat` runs in milliseconds, plus the function's last result"""
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time()
+        result = fn()
+        timings.append(time.process_time() - start)
+    return min(timings) * 1000, result
+
+def bench_zip(count: int, repeat: int):
+    """Compare CPU time per archive for deflate-everything vs format-aware compression"""
+    images = make_images(count)
+    total = sum(len(content) for _, content in images)
+
+    deflate_ms, deflate_size = cpu_best_of(lambda: deflate_all(images), repeat)
+    aware_ms, aware_size = cpu_best_of(lambda: format_aware(images), repeat)
+
+    print(f"archive: {count} images, {total / 1024 / 1024:.1f} MB of image data")
+    print(f"deflate all:  {deflate_ms:8.1f} ms CPU, {deflate_size / 1024 / 1024:6.2f} MB")
+    print(f"format-aware: {aware_ms:8.1f} ms CPU, {aware_size / 1024 / 1024:6.2f} MB")
+    print(f"CPU saved:    {deflate_ms - aware_ms:8.1f} ms per archive ({deflate_ms / aware_ms:.1f}x less)")
+
+def via_models(final_url: str, extracted: dict) -> bytes:
+    """
+    The model path: build ScrapeResponse from CompanyInfo, ContactInfo,
+    PhoneNumber and ImageInfo instances, dump it, then validate and render it
+    again the way FastAPI does for a `response_model`
+    """
+    sections = {}
+    meta = extracted["company"]
+    sections["company"] = api.CompanyInfo(name=meta.get("company_name"), description=meta.get("description"),
+                                          keywords=meta.get("keywords"), title=meta.get("title"))
+    contact = extracted["contact"]
+    sections["contact"] = api.ContactInfo(emails=contact["emails"], phones=[api.PhoneNumber(**p) for p in contact["phones"]],
+                                          address=contact["address"] or None)
+    sections["social"] = api.SocialMedia(**extracted["social"])
+    images = extracted["images"]
+    sections["images"] = [api.ImageInfo(**img) for img in images]
+    sections["image_count"] = len(images)
+    sections["logo_count"] = len([img for img in images if img["type"] in ["logo", "favicon"]])
+    result = api.ScrapeResponse(success=True, url=final_url, **sections).model_dump(exclude_unset=True)
+    validated = SCRAPE_RESPONSE.validate_python(result)
+    return JSONResponse(SCRAPE_RESPONSE.dump_python(validated, mode="json", exclude_unset=True)).body
+
+SCRAPE_RESPONSE = TypeAdapter(api.ScrapeResponse)
+
+def via_dicts(final_url: str, extracted: dict) -> bytes:
+    """The dict path: build the result dict and encode it directly"""
+    return fastjson.dumps(api.build_scrape_response(final_url, extracted))
+
+def bench_serialize(sections: int, repeat: int):
+    """Compare CPU time per /api/scrape response for the model path vs the dict path"""
+    base_url = "https://acme.test/"
+    extracted = api.run_extractors(BeautifulSoup(make_page(sections), "lxml"), base_url)
+
+    models_ms, models_body = cpu_best_of(lambda: via_models(base_url, extracted), repeat)
+    dicts_ms, dicts_body = cpu_best_of(lambda: via_dicts(base_url, extracted), repeat)
+    assert models_body == dicts_body, "dict path output differs from the model path"
+
+    encoder = "orjson" if fastjson.orjson is not None else "json"
+    print(f"response: {len(dicts_body) / 1024:.0f} KB, {len(extracted['images'])} images")
+    print(f"models + validation: {models_ms:8.1f} ms CPU")
+    print(f"dicts + {encoder:<12} {dicts_ms:8.1f} ms CPU")
+    print(f"speedup:             {models_ms / dicts_ms:8.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Web Grab & Capture benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    extract = sub.add_parser("extract", help="single-pass vs multi-pass extraction")
+    extract.add_argument("--sections", type=int, default=2000)
+    extract.add_argument("--repeat", type=int, default=5)
+
+    archive = sub.add_parser("zip", help="deflate-all vs format-aware archive compression")
+    archive.add_argument("--images", type=int, default=80)
+    archive.add_argument("--repeat", type=int, default=5)
+
+    serialize = sub.add_parser("serialize", help="Pydantic models vs plain dicts for /api/scrape responses")
+    serialize.add_argument("--sections", type=int, default=5000)
+    serialize.add_argument("--repeat", type=int, default=5)
+
+    args = parser.parse_args()
+    if args.bench == "extract":
+        bench_extract(args.sections, args.repeat)
+    elif args.bench == "zip":
+        bench_zip(args.images, args.repeat)
+    elif args.bench == "serialize":
+        bench_serialize(args.sections, args.repeat)
@@ -0,0 +1,244 @@
+"""
+Web Grab & Capture - Result Cache
+==================================
+Bounded in-memory cache for scrape results, keyed by canonical URL plus
+endpoint and requested fields. Entries are fresh for CACHE_TTL seconds,
+then served stale for up to CACHE_STALE_TTL more while a background
+refresh runs (stale-while-revalidate). The least recently used entries
+are evicted once the entry count or the approximate byte size is over
+budget. Results flagged `truncated` (cut short by a request deadline) are
+returned but never stored.
+
+With several API workers, a SharedStore (sharedstore.py) acts as a second
+level behind each worker's cache, and compute_shared() makes sure only one
+worker at a time computes a given result.
+"""
+
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import deadlines
+from settings import env_int
+from sharedstore import lease_flight
+
+# ============== Settings ==============
+
+CACHE_TTL = env_int("WEBGRAB_CACHE_TTL", 300)
+CACHE_STALE_TTL = env_int("WEBGRAB_CACHE_STALE_TTL", 3600)
+CACHE_MAX_ENTRIES = env_int("WEBGRAB_CACHE_MAX_ENTRIES", 1000)
+CACHE_MAX_BYTES = env_int("WEBGRAB_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+# ============== Keys ==============
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def canonical_url(url: str) -> str:
+    """Normalize a URL so equivalent spellings share a cache entry (case, default port, fragment, query order)"""
+    try:
+        parts = urlsplit(url.strip())
+        scheme = (parts.scheme or "https").lower()
+        host = (parts.hostname or "").lower()
+        port = parts.port
+    except ValueError:
+        return url.strip()
+    netloc = host if port is None or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+def cache_key(endpoint: str, url: str, *options) -> str:
+    """Build a cache key from the endpoint, the canonical URL and any options that change the result"""
+    return "|".join([endpoint, canonical_url(url), *(str(o) for o in options)])
+
+def cacheable(value) -> bool:
+    """Whether a result may be cached: partial results are flagged with a true `truncated`"""
+    return not (isinstance(value, dict) and value.get("truncated"))
+
+# ============== Single-Flight ==============
+
+class SingleFlight:
+    """
+    Share one in-flight call among concurrent callers asking for the same key.
+
+    The call runs outside any request's deadline and each caller waits for it
+    until its own; it is cancelled once every caller has gone. Counters are
+    grouped by the key's first `|`-separated component (see cache_key).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._waiting = {}  # task -> callers awaiting it
+        self._stats = {}
+
+    async def do(self, key: str, fn):
+        kind = self._stats.setdefault(key.split("|", 1)[0], {"executed": 0, "coalesced": 0})
+        task = self._calls.get(key)
+        if task is not None:
+            kind["coalesced"] += 1
+        else:
+            kind["executed"] += 1
+            task = deadlines.spawn(fn)
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        self._waiting[task] = self._waiting.get(task, 0) + 1
+        try:
+            return await deadlines.wait(task)
+        finally:
+            self._waiting[task] -= 1
+            if not self._waiting[task]:
+                del self._waiting[task]
+                # Forget it before cancelling, so a caller arriving during its cleanup starts afresh
+                if self._calls.get(key) is task:
+                    del self._calls[key]
+                task.cancel()
+
+    def _finish(self, key: str, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+    def stats(self) -> dict:
+        """Executed vs coalesced calls per kind, plus calls currently in flight"""
+        return {"in_flight": len(self._calls), **self._stats}
+
+# ============== Cache ==============
+
+class ResultCache:
+    """LRU + TTL cache of JSON-serializable results with stale-while-revalidate"""
+
+    def __init__(self, ttl: int = CACHE_TTL, stale_ttl: int = CACHE_STALE_TTL,
+                 max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES, shared=None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._bytes = 0
+        self._refreshing = set()
+        self._tasks = set()
+        self._stats = {"hits": 0, "stale_hits": 0, "shared_hits": 0, "misses": 0, "bypasses": 0, "evictions": 0, "refreshes": 0}
+
+    def lookup(self, key: str):
+        """Return (value, age, state) where state is 'fresh', 'stale' or None for a miss"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, 0, None
+        value, _, stored_at = entry
+        age = time.time() - stored_at
+        if age > self.ttl + self.stale_ttl:
+            self._remove(key)
+            return None, 0, None
+        self._entries.move_to_end(key)
+        return value, age, "fresh" if age <= self.ttl else "stale"
+
+    async def lookup_shared(self, key: str):
+        """lookup() in the shared store, copying a hit into this cache with its original age"""
+        found = await asyncio.to_thread(self.shared.get_result, key, self.ttl + self.stale_ttl)
+        if found is None:
+            return None, 0, None
+        value, stored_at = found
+        self.store(key, value, stored_at)
+        self._stats["shared_hits"] += 1
+        return self.lookup(key)
+
+    def store(self, key: str, value, stored_at: float = None) -> bool:
+        """Store a result, evicting least recently used entries to stay within budget; returns whether it was stored"""
+        if not cacheable(value):
+            return False
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return False
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, size, stored_at or time.time())
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+        return True
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def refresh(self, key: str, compute):
+        """Recompute a stale entry in the background (at most one refresh per key at a time)"""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        self._stats["refreshes"] += 1
+
+        async def run():
+            try:
+                self.store(key, await compute())
+            except Exception:
+                pass  # keep serving the stale copy until it expires
+            finally:
+                self._refreshing.discard(key)
+
+        task = deadlines.spawn(run)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def get_or_compute(self, key: str, compute, bypass: bool = False):
+        """
+        Return (value, cache_status) for `key`, calling `compute()` on a miss.
+
+        Stale entries are returned immediately and refreshed in the background.
+        `bypass` always recomputes but still stores the fresh result. The status
+        is an RFC 9211 Cache-Status value.
+        """
+        if bypass:
+            self._stats["bypasses"] += 1
+            value = await compute()
+            return value, "webgrab; fwd=bypass" + ("; stored" if self.store(key, value) else "")
+
+        value, age, state = self.lookup(key)
+        if state is None and self.shared is not None:
+            value, age, state = await self.lookup_shared(key)
+        if state == "fresh":
+            self._stats["hits"] += 1
+            return value, f"webgrab; hit; ttl={math.floor(self.ttl - age)}"
+        if state == "stale":
+            self._stats["stale_hits"] += 1
+            self.refresh(key, compute)
+            return value, f"webgrab; hit; ttl={math.floor(self.ttl - age)}; detail=stale-while-revalidate"
+
+        self._stats["misses"] += 1
+        value = await compute()
+        return value, "webgrab; fwd=uri-miss" + ("; stored" if self.store(key, value) else "")
+
+    async def compute_shared(self, lease_key: str, key: str, compute):
+        """
+        Run `compute()` for `key`, publishing the result to the shared store.
+
+        With a shared store only the worker holding `lease_key` computes; the
+        others wait for its result. Without one this is just `compute()`.
+        """
+        if self.shared is None:
+            return await compute()
+
+        async def publish():
+            value = await compute()
+            if cacheable(value):
+                await asyncio.to_thread(self.shared.put_result, key, value, self.ttl + self.stale_ttl)
+            return value
+
+        return await lease_flight(self.shared, lease_key, key, publish, self.ttl + self.stale_ttl)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+        }
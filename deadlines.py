@@ -0,0 +1,197 @@
+"""
+Web Grab & Capture - Request Deadlines
+=======================================
+Each scraping request gets one deadline when it arrives: REQUEST_TIMEOUT
+seconds by default, which keeps it under nginx's 60 second
+proxy_read_timeout, or sooner with `timeout=`. The deadline is kept in a
+context variable. Every stage of the request can therefore read the time
+left through remaining() and cap its own timeouts to it: the page fetch,
+the image probes and downloads, and any work it shares with concurrent
+requests. Stages that can stop early return what they have and flag the
+result as truncated.
+
+DeadlineMiddleware sets the deadline and enforces it. The request's task
+is cancelled if the client disconnects before the response is complete, or if GRACE seconds pass after the
+deadline without the response having started; it then gets 504. Cancelling
+the task also cancels the downloads it is waiting on. Once a response has
+started it is never cut off for time, so archives, event streams and NDJSON
+always end cleanly; their stages still stop early at the deadline, and
+batches give each URL a deadline of its own (see scope()).
+
+Requests outside the guarded paths, background jobs and the Streamlit UI
+have no deadline, and remaining() returns the caller's own cap. Neither
+does work shared between requests (single-flight calls, cache refreshes):
+it is started with spawn(), so one client's short `timeout=` can't cut it
+short for the others, and each request only waits for it until its own
+deadline with wait().
+"""
+
+import asyncio
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Tuple
+
+from admission import GUARDED_PATHS, guarded
+from settings import env_int
+
+# ============== Settings ==============
+
+# Longest a request may run, and the default when it doesn't ask for less
+REQUEST_TIMEOUT = env_int("WEBGRAB_REQUEST_TIMEOUT", 50)
+
+# Seconds after the deadline for wrapping up (partial results, archive trailer) before the request is cancelled
+GRACE = 5
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before this step finished"""
+
+class Deadline:
+    """Point in time (monotonic clock) by which a request has to be answered"""
+
+    def __init__(self, timeout: float):
+        self.started = time.monotonic()
+        self.timeout = timeout
+        self.expires_at = self.started + timeout
+
+    def shorten(self, timeout: float):
+        """Move the deadline to `timeout` seconds after the request arrived, if that is sooner"""
+        if timeout < self.timeout:
+            self.timeout = timeout
+            self.expires_at = self.started + timeout
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("webgrab_deadline", default=None)
+
+def current() -> Optional[Deadline]:
+    """The deadline of the request being handled, or None outside of one"""
+    return _current.get()
+
+def remaining(cap: float) -> float:
+    """`cap` seconds or the time left before the current request's deadline, whichever is less"""
+    deadline = _current.get()
+    return cap if deadline is None else min(cap, deadline.remaining())
+
+def expired() -> bool:
+    """Whether the current request's deadline has passed"""
+    deadline = _current.get()
+    return deadline is not None and deadline.remaining() <= 0
+
+def check():
+    """Raise DeadlineExceeded if the current request's deadline has passed"""
+    if expired():
+        raise DeadlineExceeded(f"Request deadline of {_current.get().timeout:g}s exceeded")
+
+@contextmanager
+def scope(timeout: Optional[float]):
+    """Run the enclosed code under a deadline of its own, `timeout` seconds from now (or none if None)"""
+    token = _current.set(None if timeout is None else Deadline(timeout))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+def spawn(fn) -> asyncio.Task:
+    """Start `fn()` as a task outside any request deadline"""
+    token = _current.set(None)
+    try:
+        return asyncio.ensure_future(fn())
+    finally:
+        _current.reset(token)
+
+async def wait(task: asyncio.Future):
+    """Await a shared task until the current request's deadline at most (leaving the task running); raises DeadlineExceeded"""
+    deadline = _current.get()
+    if deadline is None:
+        return await asyncio.shield(task)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), deadline.remaining())
+    except asyncio.TimeoutError:
+        if task.done():
+            raise  # the task itself timed out
+        raise DeadlineExceeded(f"Request deadline of {deadline.timeout:g}s exceeded") from None
+
+# ============== Middleware ==============
+
+class DeadlineMiddleware:
+    """ASGI middleware giving requests under `paths` a deadline and cancelling them on disconnect or overrun"""
+
+    def __init__(self, app, paths: Tuple[str, ...] = GUARDED_PATHS, timeout: float = REQUEST_TIMEOUT,
+                 grace: float = GRACE):
+        self.app = app
+        self.paths = paths
+        self.timeout = timeout
+        self.grace = grace
+
+    async def __call__(self, scope, receive, send):
+        if not guarded(scope, self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        deadline = Deadline(self.timeout)
+        messages = asyncio.Queue()
+        started = finished = False
+
+        async def listen():
+            # Sole reader of the client's messages, so a disconnect is seen even while the app isn't reading
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    return
+
+        async def send_tracked(message):
+            nonlocal started, finished
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+            # The server reports a disconnect once the response is complete; that one isn't the client leaving
+            finished = finished or (message["type"] == "http.response.body" and not message.get("more_body", False))
+
+        token = _current.set(deadline)
+        try:
+            request = asyncio.create_task(self.app(scope, messages.get, send_tracked))
+        finally:
+            _current.reset(token)
+        listener = asyncio.create_task(listen())
+        try:
+            while not request.done():
+                # Re-check at least every second: `timeout=` may shorten the deadline after this starts.
+                # Once the response has started only a disconnect stops it.
+                overdue_in = deadline.expires_at + self.grace - time.monotonic()
+                await asyncio.wait({request, listener}, timeout=None if started else min(max(overdue_in, 0), 1),
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if request.done():
+                    break
+                if finished:
+                    # Let the app clean up after a complete response (e.g. release its admission slot)
+                    await request
+                    return
+                if listener.done() or (not started and time.monotonic() >= deadline.expires_at + self.grace):
+                    request.cancel()
+                    try:
+                        await request
+                    except asyncio.CancelledError:
+                        pass
+                    if not started and not listener.done():
+                        await self.timed_out(send, deadline)
+                    return
+            request.result()
+        finally:
+            for task in (request, listener):
+                task.cancel()
+            await asyncio.gather(request, listener, return_exceptions=True)
+
+    async def timed_out(self, send, deadline: Deadline):
+        body = json.dumps({"detail": f"Request deadline of {deadline.timeout:g}s exceeded"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 504,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
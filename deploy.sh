@@ -7,6 +7,7 @@ echo "=== Deploying Web Grab & Capture ==="
 LOCAL_PATH="/home/lucas/Documents/Web-Grab-Capture"
 SERVER_PATH="/var/www/webgrab"
 VENV_PATH="$SERVER_PATH/.venv"
+API_WORKERS="${WEBGRAB_API_WORKERS:-$(nproc)}"
 
 # Sync application files
 echo "Syncing application files..."
@@ -34,9 +35,9 @@ echo "Setting permissions..."
 sudo chown -R www-data:www-data "$SERVER_PATH"
 sudo chmod -R 755 "$SERVER_PATH"
 
-# Create exports directory (writable for image downloads)
-sudo mkdir -p "$SERVER_PATH/exports"
-sudo chown www-data:www-data "$SERVER_PATH/exports"
+# Create exports directory (writable for image downloads and cached archives)
+sudo mkdir -p "$SERVER_PATH/exports/archives"
+sudo chown -R www-data:www-data "$SERVER_PATH/exports"
 
 # Setup PM2 processes for Streamlit UI and FastAPI API
 echo "Setting up PM2 processes..."
@@ -56,14 +57,16 @@ sudo pm2 start "$VENV_PATH/bin/python" \
     --server.enableXsrfProtection false \
     --browser.gatherUsageStats false
 
-# Start FastAPI API (port 8000)
-sudo pm2 start "$VENV_PATH/bin/python" \
+# Start FastAPI API (port 8000) with one worker per core sharing cache and limits;
+# cached archives are handed to nginx via X-Accel-Redirect
+sudo WEBGRAB_ACCEL_REDIRECT=1 WEBGRAB_SHARED_STATE=1 pm2 start "$VENV_PATH/bin/python" \
     --name webgrab-api \
     --interpreter none \
     --cwd "$SERVER_PATH" \
     -- -m uvicorn api:app \
     --host 0.0.0.0 \
     --port 8000 \
+    --workers "$API_WORKERS" \
     --root-path /webgrab-api
 
 # Save PM2 process list
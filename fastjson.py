@@ -0,0 +1,34 @@
+"""
+Web Grab & Capture - JSON Encoding
+===================================
+Scrape results are plain dicts from extraction to the wire: they are
+cached, streamed and returned as dicts, and encoded straight to bytes here.
+The Pydantic models in api.py describe the responses for the OpenAPI
+schema, but results aren't built from or validated against them, which for
+pages with thousands of images cost more CPU than the scrape itself (see
+`python bench.py serialize`).
+
+orjson is used when it is installed, the standard library otherwise; both
+produce the same compact UTF-8 output as FastAPI's JSONResponse.
+"""
+
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps(value) -> bytes:
+    """Encode a JSON-compatible value (dicts, lists, str, numbers, bool, None) as compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps()"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
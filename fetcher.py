@@ -0,0 +1,346 @@
+"""
+Web Grab & Capture - HTTP Fetch Layer
+======================================
+Async HTTP client used to fetch pages and images without blocking the
+event loop. One client (and its connection pool) is shared by every
+request handled in the process, so a page and its same-origin images
+ride a handful of keep-alive connections instead of one handshake each.
+Synchronous callers such as the Streamlit UI go through run_sync(),
+which runs coroutines on a long-lived background loop so the pool
+survives between reruns.
+
+Pool sizing can be tuned with WEBGRAB_* environment variables (see
+Settings below); pool_stats() reports how well connections are reused.
+
+Pages are looked up in the on-disk snapshot store (snapshots.py) before
+going to the network, and complete fetches are written back to it.
+
+Images are streamed and sniffed as they arrive: tracking pixels and spacer
+images are recognised from their header bytes and abandoned without reading
+the rest. probe_image() reads only the first few KB of an image (via a Range
+request where the server supports it) to report its format and size.
+
+Every timeout here is capped at what is left of the current request's
+deadline (deadlines.py).
+"""
+
+import asyncio
+import ssl
+import threading
+import httpx
+from collections import defaultdict
+from typing import Optional, List
+from urllib.parse import urlparse
+
+import deadlines
+import imageinfo
+import snapshots
+from settings import env_int
+
+# ============== Settings ==============
+
+PAGE_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+IMAGE_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+PAGE_TIMEOUT = 15
+IMAGE_TIMEOUT = 10
+
+# Connection pool: total connections, idle connections kept alive, and idle expiry in seconds
+MAX_CONNECTIONS = env_int("WEBGRAB_MAX_CONNECTIONS", 200)
+MAX_KEEPALIVE_CONNECTIONS = env_int("WEBGRAB_MAX_KEEPALIVE", 50)
+KEEPALIVE_EXPIRY = env_int("WEBGRAB_KEEPALIVE_EXPIRY", 30)
+
+# Image downloads and crawled pages in flight to any one host (the pool itself has no per-host limit)
+CONCURRENCY_PER_HOST = env_int("WEBGRAB_CONCURRENCY_PER_HOST", 6)
+
+# Image downloads: total in flight, in flight per origin, and overall budget in seconds
+IMAGE_CONCURRENCY = env_int("WEBGRAB_IMAGE_CONCURRENCY", 16)
+IMAGE_CONCURRENCY_PER_HOST = CONCURRENCY_PER_HOST
+IMAGE_DEADLINE = 30
+
+# Images this small are assumed broken or placeholders
+MIN_IMAGE_BYTES = 100
+
+# Bytes read to identify an image's format and dimensions
+PROBE_BYTES = env_int("WEBGRAB_PROBE_BYTES", 16 * 1024)
+
+# Pages: largest HTML body we will read, and the content types worth parsing
+# (a missing Content-Type is let through)
+MAX_HTML_BYTES = env_int("WEBGRAB_MAX_HTML_BYTES", 5 * 1024 * 1024)
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "application/xml", "text/xml", "text/plain")
+
+# Markers that end the <head> section for head-only fetches (matched case-insensitively)
+HEAD_END_MARKERS = (b"</head", b"<body")
+
+# Errors raised for unreachable hosts, bad status codes and malformed URLs
+FETCH_ERRORS = (httpx.HTTPError, httpx.InvalidURL)
+
+class ResponseTooLarge(Exception):
+    """The response body exceeded the byte budget and was abandoned mid-download"""
+
+class UnsupportedContentType(Exception):
+    """The server announced something other than HTML, so the body was never read"""
+
+class TrackingPixel(Exception):
+    """The image's header showed a tracking pixel or spacer, so the download was abandoned"""
+
+# ============== Client ==============
+
+# One SSL context for every connection, so CA certificates are loaded once.
+# Each new TLS connection still does a full handshake (client-side session
+# resumption isn't used); handshakes are saved by keeping connections alive.
+_ssl_context = ssl.create_default_context()
+
+_stats = {"requests": 0, "connections_opened": 0, "tls_handshakes": 0, "clients_created": 0}
+
+async def _trace(event: str, info: dict):
+    """httpcore trace hook counting new connections and the (full) TLS handshakes they made"""
+    if event == "connection.connect_tcp.complete":
+        _stats["connections_opened"] += 1
+    elif event == "connection.start_tls.complete":
+        _stats["tls_handshakes"] += 1
+
+def pool_stats() -> dict:
+    """Connection pool settings, per-host download concurrency and reuse counters for this process"""
+    reused = max(_stats["requests"] - _stats["connections_opened"], 0)
+    return {
+        **_stats,
+        "reused_connections": reused,
+        "reuse_ratio": round(reused / _stats["requests"], 3) if _stats["requests"] else 0.0,
+        "max_connections": MAX_CONNECTIONS,
+        "max_keepalive_connections": MAX_KEEPALIVE_CONNECTIONS,
+        "keepalive_expiry": KEEPALIVE_EXPIRY,
+        "concurrency_per_host": CONCURRENCY_PER_HOST,
+    }
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared async client, creating it on first use (or when the event loop changed)"""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client_loop = loop
+        _client = httpx.AsyncClient(
+            follow_redirects=True,
+            verify=_ssl_context,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+        )
+        _stats["clients_created"] += 1
+    return _client
+
+async def close_client():
+    """Close the shared client and release its pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+# ============== Sync Bridge ==============
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def run_sync(coro):
+    """Run a coroutine on the shared background loop and wait for its result"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="fetcher-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+# ============== Fetching ==============
+
+def stream(url: str, user_agent: str, timeout: float, headers: Optional[dict] = None):
+    """Streaming GET through the shared pool (use as `async with`)"""
+    _stats["requests"] += 1
+    return get_client().stream("GET", url, headers={"User-Agent": user_agent, **(headers or {})},
+                               timeout=deadlines.remaining(timeout),
+                               extensions={"trace": _trace})
+
+def find_head_end(body: bytearray, start: int) -> int:
+    """Offset where the <head> section ends in `body`, searching from `start`; -1 if not seen yet"""
+    window = bytes(body[start:]).lower()
+    found = [i for i in (window.find(marker) for marker in HEAD_END_MARKERS) if i != -1]
+    return start + min(found) if found else -1
+
+async def fetch_page(url: str, check_status: bool = True, max_bytes: int = MAX_HTML_BYTES,
+                     head_only: bool = False, refresh: bool = False):
+    """
+    Fetch a webpage, returning its raw bytes and the final URL after redirects.
+    
+    The body is streamed and abandoned past `max_bytes` (ResponseTooLarge);
+    non-HTML responses are rejected from their headers (UnsupportedContentType).
+    `head_only` stops at the end of <head>; fresh snapshots are served unless
+    `refresh` is set.
+    """
+    if not refresh:
+        snapshot = await asyncio.to_thread(snapshots.store.get, url)
+        if snapshot is not None and len(snapshot["body"]) <= max_bytes:
+            body = snapshot["body"]
+            if head_only:
+                head_end = find_head_end(bytearray(body), 0)
+                if head_end != -1:
+                    body = body[:head_end]
+            return body, snapshot["final_url"]
+    
+    async with stream(url, PAGE_USER_AGENT, PAGE_TIMEOUT) as response:
+        if check_status:
+            response.raise_for_status()
+        
+        content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type and content_type not in HTML_CONTENT_TYPES:
+            raise UnsupportedContentType(f"Expected an HTML page but got '{content_type}'")
+        
+        # A head-only read usually stops long before the end, so only the streamed cap applies to it
+        declared = response.headers.get("content-length", "")
+        if not head_only and declared.isdigit() and int(declared) > max_bytes:
+            raise ResponseTooLarge(f"Page is {declared} bytes, over the {max_bytes} byte limit")
+        
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            deadlines.check()
+            scanned = max(len(body) - 8, 0)
+            body += chunk
+            if head_only:
+                head_end = find_head_end(body, scanned)
+                if head_end != -1:
+                    return bytes(body[:head_end]), str(response.url)
+            if len(body) > max_bytes:
+                raise ResponseTooLarge(f"Page exceeds the {max_bytes} byte limit")
+        
+        body = bytes(body)
+        if response.status_code == 200:
+            await asyncio.to_thread(snapshots.store.put, url, str(response.url), response.status_code,
+                                    dict(response.headers), body)
+        return body, str(response.url)
+
+async def fetch_image(url: str, max_bytes: Optional[int] = None) -> Optional[bytes]:
+    """
+    Fetch an image, returning its bytes or None if it is missing or not worth keeping.
+    
+    Bodies declared at MIN_IMAGE_BYTES or less are skipped unread, and the
+    download is abandoned with TrackingPixel as soon as the header bytes show
+    a tracking pixel or spacer (see imageinfo.is_tracking_pixel). Images over
+    `max_bytes` raise ResponseTooLarge, from Content-Length or mid-stream.
+    """
+    try:
+        async with stream(url, IMAGE_USER_AGENT, IMAGE_TIMEOUT) as response:
+            if response.status_code != 200:
+                return None
+            declared = response.headers.get("content-length", "")
+            if declared.isdigit() and int(declared) <= MIN_IMAGE_BYTES:
+                return None
+            if declared.isdigit() and max_bytes is not None and int(declared) > max_bytes:
+                raise ResponseTooLarge(f"Image is {declared} bytes, over the {max_bytes} byte limit")
+            
+            body = bytearray()
+            sniffing = True
+            async for chunk in response.aiter_bytes():
+                body += chunk
+                if max_bytes is not None and len(body) > max_bytes:
+                    raise ResponseTooLarge(f"Image exceeds the {max_bytes} byte limit")
+                if sniffing:
+                    info = imageinfo.probe(bytes(body[:PROBE_BYTES]))
+                    if imageinfo.is_tracking_pixel(info):
+                        raise TrackingPixel(f"{info['width']}x{info['height']} image")
+                    # Stop sniffing once the size is known or it isn't in the header
+                    sniffing = info["width"] is None and len(body) < PROBE_BYTES
+    except FETCH_ERRORS:
+        return None
+    return bytes(body) if len(body) > MIN_IMAGE_BYTES else None
+
+async def probe_image(url: str, probe_bytes: int = PROBE_BYTES) -> Optional[dict]:
+    """
+    Identify an image from its first `probe_bytes` without downloading it in full.
+    
+    Sends a Range request and stops reading once the dimensions are known, so
+    servers that ignore Range still only send a few KB before the connection
+    is dropped. Returns {'format', 'width', 'height', 'bytes'} (None for
+    anything that couldn't be determined) or None if the image is unreachable.
+    """
+    try:
+        async with stream(url, IMAGE_USER_AGENT, IMAGE_TIMEOUT, headers={"Range": f"bytes=0-{probe_bytes - 1}"}) as response:
+            if response.status_code not in (200, 206):
+                return None
+            total = response.headers.get("content-range", "").rpartition("/")[2]
+            if response.status_code == 200:
+                total = response.headers.get("content-length", "")
+            
+            head = bytearray()
+            complete = True
+            async for chunk in response.aiter_bytes():
+                head += chunk
+                info = imageinfo.probe(bytes(head[:probe_bytes]))
+                if info["width"] is not None or len(head) >= probe_bytes:
+                    complete = False
+                    break
+            else:
+                info = imageinfo.probe(bytes(head))
+    except FETCH_ERRORS:
+        return None
+    
+    if total.isdigit():
+        info["bytes"] = int(total)
+    else:
+        # Without a declared size we only know it when the whole body was read
+        info["bytes"] = len(head) if complete and response.status_code == 200 else None
+    return info
+
+async def iter_images(urls: List[str], concurrency: int = IMAGE_CONCURRENCY,
+                      per_host: int = IMAGE_CONCURRENCY_PER_HOST, deadline: float = IMAGE_DEADLINE,
+                      fetch=fetch_image):
+    """
+    Download many images concurrently, yielding (index, content) as each one finishes.
+    
+    At most `concurrency` downloads run at once, `per_host` per origin, until
+    `deadline` (or the request's deadline); the rest are cancelled. `content`
+    is None for failed or tiny images; `fetch` can wrap fetch_image.
+    """
+    deadline = deadlines.remaining(deadline)
+    if not urls or deadline <= 0:
+        return
+    
+    slots = asyncio.Semaphore(concurrency)
+    host_slots = defaultdict(lambda: asyncio.Semaphore(per_host))
+    
+    async def fetch_one(i: int, url: str):
+        # Wait for the origin first so a busy host doesn't hold global slots
+        async with host_slots[urlparse(url).netloc]:
+            async with slots:
+                try:
+                    return i, await fetch(url)
+                except Exception:
+                    return i, None
+    
+    tasks = [asyncio.create_task(fetch_one(i, url)) for i, url in enumerate(urls)]
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=deadline):
+            try:
+                yield await next_done
+            except asyncio.TimeoutError:
+                return
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def fetch_images(urls: List[str], concurrency: int = IMAGE_CONCURRENCY,
+                       per_host: int = IMAGE_CONCURRENCY_PER_HOST, deadline: float = IMAGE_DEADLINE,
+                       fetch=fetch_image) -> List[Optional[bytes]]:
+    """
+    Fetch many images concurrently (see iter_images).
+    
+    Results are returned in the same order as `urls`, with None for images
+    that failed, were too small, or missed the deadline.
+    """
+    results: List[Optional[bytes]] = [None] * len(urls)
+    async for i, content in iter_images(urls, concurrency, per_host, deadline, fetch):
+        results[i] = content
+    return results
@@ -0,0 +1,137 @@
+"""
+Web Grab & Capture - Image Sniffing
+====================================
+Identify image formats and pixel dimensions from their first bytes rather
+than trusting file extensions or Content-Type headers, which are often
+wrong or missing. Everything here works on a prefix of the file (the first
+few KB), so images can be classified without downloading them in full.
+"""
+
+import re
+import struct
+from typing import Optional, Tuple
+
+# Formats whose data is already compressed; deflating them again costs CPU and saves nothing
+COMPRESSED_FORMATS = {"jpeg", "png", "gif", "webp", "avif", "heic"}
+
+def detect_format(data: bytes) -> Optional[str]:
+    """Return the image format name from magic bytes, or None if unrecognized"""
+    head = data[:32]
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"avif", b"avis"):
+            return "avif"
+        if brand in (b"heic", b"heix", b"mif1", b"msf1"):
+            return "heic"
+    if head.startswith(b"BM"):
+        return "bmp"
+    if head.startswith((b"\x00\x00\x01\x00", b"\x00\x00\x02\x00")):
+        return "ico"
+    if head.startswith((b"II*\x00", b"MM\x00*")):
+        return "tiff"
+    text = data[:512].lstrip().lower()
+    if text.startswith(b"<svg") or (text.startswith(b"<?xml") and b"<svg" in text):
+        return "svg"
+    return None
+
+def is_compressed(data: bytes) -> bool:
+    """True for formats that won't shrink under deflate (JPEG, PNG, GIF, WebP, AVIF, HEIC)"""
+    return detect_format(data) in COMPRESSED_FORMATS
+
+# ============== Dimensions ==============
+
+# JPEG start-of-frame markers (baseline, progressive, lossless, arithmetic) carry the size
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+SVG_TAG_RE = re.compile(rb"<svg\b[^>]*>", re.I | re.S)
+SVG_LENGTH_RE = r'\b{}\s*=\s*["\']\s*([\d.]+)\s*(?:px)?\s*["\']'
+SVG_VIEWBOX_RE = re.compile(r'\bviewBox\s*=\s*["\']\s*[-\d.]+[\s,]+[-\d.]+[\s,]+([\d.]+)[\s,]+([\d.]+)', re.I)
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # markers without a length
+            i += 2
+            continue
+        i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+    return None
+
+def _webp_size(data: bytes) -> Optional[Tuple[int, int]]:
+    chunk = data[12:16]
+    if chunk == b"VP8 " and len(data) >= 30:
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(data) >= 25:
+        b0, b1, b2, b3 = data[21:25]
+        return 1 + (((b1 & 0x3F) << 8) | b0), 1 + (((b3 & 0x0F) << 10) | (b2 << 2) | ((b1 & 0xC0) >> 6))
+    if chunk == b"VP8X" and len(data) >= 30:
+        return 1 + int.from_bytes(data[24:27], "little"), 1 + int.from_bytes(data[27:30], "little")
+    return None
+
+def _svg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    tag = SVG_TAG_RE.search(data[:4096])
+    if not tag:
+        return None
+    text = tag.group(0).decode("utf-8", "replace")
+    width = re.search(SVG_LENGTH_RE.format("width"), text, re.I)
+    height = re.search(SVG_LENGTH_RE.format("height"), text, re.I)
+    if width and height:
+        return round(float(width.group(1))), round(float(height.group(1)))
+    viewbox = SVG_VIEWBOX_RE.search(text)
+    if viewbox:
+        return round(float(viewbox.group(1))), round(float(viewbox.group(2)))
+    return None
+
+def image_size(data: bytes, fmt: Optional[str] = None) -> Optional[Tuple[int, int]]:
+    """Return (width, height) in pixels from the start of an image file, or None if unknown"""
+    fmt = fmt or detect_format(data)
+    try:
+        if fmt == "png" and len(data) >= 24:
+            return struct.unpack(">II", data[16:24])
+        if fmt == "gif" and len(data) >= 10:
+            return struct.unpack("<HH", data[6:10])
+        if fmt == "jpeg":
+            return _jpeg_size(data)
+        if fmt == "webp":
+            return _webp_size(data)
+        if fmt == "bmp" and len(data) >= 26:
+            width, height = struct.unpack("<ii", data[18:26])
+            return abs(width), abs(height)
+        if fmt == "ico" and len(data) >= 8:
+            return data[6] or 256, data[7] or 256
+        if fmt in ("avif", "heic"):
+            i = data.find(b"ispe")
+            if i != -1 and len(data) >= i + 16:
+                return struct.unpack(">II", data[i + 8:i + 16])
+        if fmt == "svg":
+            return _svg_size(data)
+    except (struct.error, ValueError):
+        pass
+    return None
+
+def probe(data: bytes) -> dict:
+    """Format and pixel size of an image from its first bytes ({'format', 'width', 'height'}, None when unknown)"""
+    fmt = detect_format(data)
+    size = image_size(data, fmt)
+    return {"format": fmt, "width": size[0] if size else None, "height": size[1] if size else None}
+
+def is_tracking_pixel(info: dict) -> bool:
+    """True for 1x1 trackers and thin spacer images (either side 2px or less)"""
+    return info["width"] is not None and info["height"] is not None and min(info["width"], info["height"]) <= 2
@@ -0,0 +1,335 @@
+"""
+Web Grab & Capture - Background Jobs
+=====================================
+Persistent job queue for work that outlives an HTTP request (large image
+archives, long batches), which would otherwise run into nginx's 60 second
+proxy_read_timeout. Clients submit a job, get its id back immediately and
+poll for status, progress and the result.
+
+Jobs live in a SQLite database under DATA_DIR, so queued and finished jobs
+survive restarts. A few asyncio workers in each API process claim queued
+jobs one at a time and run them with the handler registered for their
+kind. Running jobs record the claiming process and a heartbeat; a job whose
+process died or stopped heart-beating is put back in the queue, so with
+several API processes one crashing doesn't strand its jobs and the others
+don't steal jobs that are still running. Finished jobs (and their archives)
+are removed after JOB_TTL seconds.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from archive_cache import ARCHIVE_DIR
+from settings import DATA_DIR, env_int
+
+# ============== Settings ==============
+
+JOB_DB = DATA_DIR / "jobs.sqlite3"
+JOB_WORKERS = env_int("WEBGRAB_JOB_WORKERS", 2)
+JOB_TTL = env_int("WEBGRAB_JOB_TTL", 24 * 3600)
+
+# Workers also check the queue this often, for jobs submitted by other processes
+JOB_POLL_INTERVAL = 2
+
+# Progress is written to the database at most this often per job
+PROGRESS_INTERVAL = 0.5
+
+# Running jobs are heart-beaten this often; a job whose heartbeat is older
+# than JOB_LEASE belonged to a stuck or dead process and is requeued
+JOB_HEARTBEAT = 10
+JOB_LEASE = 60
+
+# Job archives sit under the archive directory so nginx can serve them too
+JOB_ARCHIVE_DIR = ARCHIVE_DIR / "jobs"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    worker INTEGER,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created_at);
+"""
+
+# Columns added after the first release, for databases created before them
+MIGRATIONS = (
+    "ALTER TABLE jobs ADD COLUMN worker INTEGER",
+    "ALTER TABLE jobs ADD COLUMN heartbeat_at REAL",
+)
+
+# Job states: queued -> running -> done | failed
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+def archive_path(job_id: str) -> Path:
+    """Where the ZIP archive produced by a job is kept"""
+    return JOB_ARCHIVE_DIR / f"{job_id}.zip"
+
+def process_alive(pid: Optional[int]) -> bool:
+    """Whether a process with this id exists on this machine"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    return True
+
+# ============== Store ==============
+
+class JobStore:
+    """Jobs and their results in SQLite, shared by every API process on the box"""
+
+    def __init__(self, path=JOB_DB, ttl: int = JOB_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(SCHEMA)
+                    for statement in MIGRATIONS:
+                        try:
+                            conn.execute(statement)
+                        except sqlite3.OperationalError:
+                            pass  # column already there
+                    self._ready = True
+        return conn
+
+    @contextmanager
+    def _db(self, immediate: bool = False):
+        """Connection inside one transaction (taking the write lock up front if `immediate`)"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def submit(self, kind: str, params: dict) -> str:
+        """Queue a job and return its id"""
+        job_id = uuid.uuid4().hex
+        with self._db() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, params, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(params), QUEUED, time.time()),
+            )
+        return job_id
+
+    def claim(self) -> Optional[dict]:
+        """Take the oldest queued job and mark it running in this process, or return None if the queue is empty"""
+        with self._db(immediate=True) as conn:
+            row = conn.execute(
+                "SELECT id, kind, params FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            conn.execute("UPDATE jobs SET status = ?, started_at = ?, worker = ?, heartbeat_at = ? WHERE id = ?",
+                         (RUNNING, now, os.getpid(), now, row["id"]))
+        return {"id": row["id"], "kind": row["kind"], "params": json.loads(row["params"])}
+
+    def progress(self, job_id: str, done: int, total: Optional[int]):
+        with self._db() as conn:
+            conn.execute("UPDATE jobs SET done = ?, total = ?, heartbeat_at = ? WHERE id = ?",
+                         (done, total, time.time(), job_id))
+
+    def heartbeat(self) -> int:
+        """Mark this process's running jobs as alive; returns how many there are"""
+        with self._db() as conn:
+            return conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND worker = ?",
+                                (time.time(), RUNNING, os.getpid())).rowcount
+
+    def finish(self, job_id: str, result):
+        with self._db() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE id = ?",
+                (DONE, json.dumps(result), time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str):
+        with self._db() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (FAILED, error, time.time(), job_id),
+            )
+
+    def requeue(self, job_id: str) -> int:
+        """Put a running job back in the queue; returns how many were requeued"""
+        with self._db() as conn:
+            return conn.execute("UPDATE jobs SET status = ?, started_at = NULL, worker = NULL WHERE id = ? AND status = ?",
+                                (QUEUED, job_id, RUNNING)).rowcount
+
+    def requeue_stale(self, lease: float = JOB_LEASE) -> int:
+        """Requeue running jobs whose process is gone or whose heartbeat is older than `lease` seconds"""
+        with self._db(immediate=True) as conn:
+            rows = conn.execute("SELECT id, worker, heartbeat_at FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            stale = [
+                (QUEUED, row["id"]) for row in rows
+                if not process_alive(row["worker"]) or (row["heartbeat_at"] or 0) < time.time() - lease
+            ]
+            conn.executemany("UPDATE jobs SET status = ?, started_at = NULL, worker = NULL WHERE id = ?", stale)
+        return len(stale)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """A job's status, progress, result and timestamps, or None if unknown or expired"""
+        with self._db() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def prune(self) -> int:
+        """Delete jobs that finished more than `ttl` seconds ago, with their archives"""
+        with self._db() as conn:
+            expired = [row["id"] for row in conn.execute(
+                "SELECT id FROM jobs WHERE finished_at < ?", (time.time() - self.ttl,)
+            ).fetchall()]
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in expired])
+        for job_id in expired:
+            archive_path(job_id).unlink(missing_ok=True)
+        return len(expired)
+
+    def stats(self) -> dict:
+        """Number of jobs in each state"""
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        if self.path.exists():
+            try:
+                with self._db() as conn:
+                    for row in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+                        counts[row["status"]] = row["n"]
+            except sqlite3.Error:
+                pass
+        return counts
+
+# ============== Workers ==============
+
+class JobWorkers:
+    """
+    Background tasks that run queued jobs.
+
+    `handlers` maps a job kind to `async handler(job, progress)`, where `job`
+    has id, kind and params, and `await progress(done, total)` reports how far
+    along it is. The handler's return value (JSON-serializable) becomes the
+    job's result; an exception fails the job with its message.
+    """
+
+    def __init__(self, store: JobStore, handlers: dict, count: int = JOB_WORKERS):
+        self.store = store
+        self.handlers = handlers
+        self.count = count
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._stats = {"completed": 0, "failed": 0}
+
+    async def start(self):
+        """Requeue jobs left behind by dead processes, then start the workers and the heartbeat"""
+        try:
+            await asyncio.to_thread(self.store.requeue_stale)
+            await asyncio.to_thread(self.store.prune)
+        except (sqlite3.Error, OSError):
+            pass  # the workers keep retrying until the database is usable
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.count)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        """Cancel the workers; jobs they were running go back in the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake an idle worker after a job was submitted"""
+        self._wakeup.set()
+
+    async def _work(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim)
+            except (sqlite3.Error, OSError):
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._run(job)
+
+    async def _heartbeat(self):
+        # Keep our running jobs claimed and pick up those of processes that died
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT)
+            try:
+                await asyncio.to_thread(self.store.heartbeat)
+                if await asyncio.to_thread(self.store.requeue_stale):
+                    self.notify()
+            except (sqlite3.Error, OSError):
+                pass
+
+    async def _run(self, job: dict):
+        last_write = 0.0
+
+        async def progress(done: int, total: Optional[int] = None):
+            nonlocal last_write
+            now = time.monotonic()
+            if now - last_write >= PROGRESS_INTERVAL or done == total:
+                last_write = now
+                await asyncio.to_thread(self.store.progress, job["id"], done, total)
+
+        try:
+            result = await self.handlers[job["kind"]](job, progress)
+        except asyncio.CancelledError:
+            await asyncio.shield(asyncio.to_thread(self.store.requeue, job["id"]))
+            raise
+        except Exception as e:
+            self._stats["failed"] += 1
+            # HTTPExceptions raised by the shared scrape code carry their message in `detail`
+            await asyncio.to_thread(self.store.fail, job["id"], str(getattr(e, "detail", None) or e))
+        else:
+            self._stats["completed"] += 1
+            await asyncio.to_thread(self.store.finish, job["id"], result)
+
+    def stats(self) -> dict:
+        """Worker count and jobs completed or failed by this process"""
+        return {"count": self.count if self._tasks else 0, **self._stats}
+
+# Shared by the API process
+store = JobStore()
@@ -0,0 +1,26 @@
+"""
+Web Grab & Capture - Settings Helpers
+======================================
+Every tunable is read from a WEBGRAB_* environment variable by the module
+that owns it; these helpers keep the parsing consistent.
+"""
+
+import os
+from pathlib import Path
+
+# Writable data directory shared by the UI and API processes (see deploy.sh)
+DATA_DIR = Path(os.environ.get("WEBGRAB_DATA_DIR", Path(__file__).resolve().parent / "exports"))
+
+def env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def env_bool(name: str, default: bool) -> bool:
+    """Read an on/off setting from the environment (1/true/yes/on)"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
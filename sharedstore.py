@@ -0,0 +1,233 @@
+"""
+Web Grab & Capture - Cross-Process Shared State
+================================================
+When the API runs as several uvicorn workers (see deploy.sh), each worker
+has its own memory, so in-process caches, single-flight and per-client
+limits would each be multiplied by the number of workers. This module
+keeps the state that must be shared in one SQLite database under DATA_DIR
+(WAL mode, so workers read and write it concurrently):
+
+- results: second-level result cache behind each worker's ResultCache, so a
+  page scraped by one worker is a cache hit in all of them
+- leases: cross-process single-flight; the worker holding a key's lease
+  computes the result and the others wait for it to land in `results`
+- slots: running requests per client, so per-client quotas hold across
+  workers
+
+Enabled with WEBGRAB_SHARED_STATE=1. Per-process concurrency limits stay
+per process, since what they protect (memory) is per process too. Job state
+and page snapshots already live in their own SQLite databases.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+from settings import DATA_DIR, env_bool, env_int
+
+# ============== Settings ==============
+
+SHARED_STATE = env_bool("WEBGRAB_SHARED_STATE", False)
+SHARED_DB = DATA_DIR / "shared.sqlite3"
+SHARED_CACHE_MAX_BYTES = env_int("WEBGRAB_SHARED_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+
+# A lease or client slot left behind by a crashed worker expires after this many seconds
+LEASE_TTL = 60
+SLOT_TTL = 15 * 60
+
+# How often a worker waiting on another worker's lease checks for the result
+LEASE_POLL_INTERVAL = 0.1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_stored ON results (stored_at);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS slots (
+    id TEXT PRIMARY KEY,
+    client TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS slots_client ON slots (client);
+"""
+
+# ============== Store ==============
+
+class SharedStore:
+    """Result cache, leases and client slots shared by every worker on the box"""
+
+    def __init__(self, path=SHARED_DB, max_bytes: int = SHARED_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._ready = False
+        self._lock = threading.Lock()
+        self._stats = {"result_hits": 0, "result_misses": 0, "result_writes": 0,
+                       "leases_taken": 0, "lease_waits": 0, "errors": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(SCHEMA)
+                    self._ready = True
+        return conn
+
+    @contextmanager
+    def _db(self, immediate: bool = False):
+        """Connection inside one transaction (taking the write lock up front if `immediate`)"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    # Results
+
+    def get_result(self, key: str, max_age: float):
+        """Return (value, stored_at) for a result stored less than `max_age` seconds ago, or None"""
+        try:
+            with self._db() as conn:
+                row = conn.execute("SELECT value, stored_at FROM results WHERE key = ? AND stored_at >= ?",
+                                   (key, time.time() - max_age)).fetchone()
+        except sqlite3.Error:
+            self._stats["errors"] += 1
+            return None
+        self._stats["result_hits" if row else "result_misses"] += 1
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put_result(self, key: str, value, max_age: float):
+        """Store a result, dropping results older than `max_age` and the oldest ones while over quota"""
+        data = json.dumps(value, default=str)
+        if len(data) > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            with self._db(immediate=True) as conn:
+                conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", (key, data, len(data), now))
+                conn.execute("DELETE FROM results WHERE stored_at < ?", (now - max_age,))
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+                if total > self.max_bytes:
+                    for old_key, size in conn.execute("SELECT key, size FROM results ORDER BY stored_at").fetchall():
+                        conn.execute("DELETE FROM results WHERE key = ?", (old_key,))
+                        total -= size
+                        if total <= self.max_bytes:
+                            break
+            self._stats["result_writes"] += 1
+        except sqlite3.Error:
+            self._stats["errors"] += 1
+
+    # Leases
+
+    def try_lease(self, key: str, ttl: float = LEASE_TTL) -> bool:
+        """Take the lease on `key` unless another worker holds an unexpired one"""
+        now = time.time()
+        try:
+            with self._db(immediate=True) as conn:
+                conn.execute("DELETE FROM leases WHERE key = ? AND expires_at < ?", (key, now))
+                taken = conn.execute("INSERT OR IGNORE INTO leases VALUES (?, ?, ?)",
+                                     (key, self.owner, now + ttl)).rowcount == 1
+        except sqlite3.Error:
+            self._stats["errors"] += 1
+            return True  # without the store, fall back to computing locally
+        if taken:
+            self._stats["leases_taken"] += 1
+        return taken
+
+    def release_lease(self, key: str):
+        try:
+            with self._db() as conn:
+                conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+        except sqlite3.Error:
+            self._stats["errors"] += 1
+
+    # Client slots
+
+    def acquire_slot(self, client: str, limit: int, ttl: float = SLOT_TTL) -> Optional[str]:
+        """Record a running request for `client`, or return None if it already has `limit` across all workers"""
+        now = time.time()
+        slot_id = uuid.uuid4().hex
+        try:
+            with self._db(immediate=True) as conn:
+                conn.execute("DELETE FROM slots WHERE expires_at < ?", (now,))
+                held = conn.execute("SELECT COUNT(*) FROM slots WHERE client = ?", (client,)).fetchone()[0]
+                if held >= limit:
+                    return None
+                conn.execute("INSERT INTO slots VALUES (?, ?, ?)", (slot_id, client, now + ttl))
+        except sqlite3.Error:
+            self._stats["errors"] += 1
+            return ""  # admit; the per-process limits still apply
+        return slot_id
+
+    def release_slot(self, slot_id: str):
+        if not slot_id:
+            return
+        try:
+            with self._db() as conn:
+                conn.execute("DELETE FROM slots WHERE id = ?", (slot_id,))
+        except sqlite3.Error:
+            self._stats["errors"] += 1
+
+    def stats(self) -> dict:
+        """Counters for this worker and the shared tables' sizes"""
+        stored = {"results": 0, "result_bytes": 0, "leases": 0, "slots": 0}
+        if self.path.exists():
+            try:
+                with self._db() as conn:
+                    stored["results"], stored["result_bytes"] = conn.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+                    stored["leases"] = conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0]
+                    stored["slots"] = conn.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+            except sqlite3.Error:
+                pass
+        return {"enabled": True, "pid": os.getpid(), **self._stats, **stored, "max_bytes": self.max_bytes}
+
+# ============== Single-Flight ==============
+
+async def lease_flight(store: SharedStore, lease_key: str, result_key: str, fn, max_age: float):
+    """
+    Run `fn()` in only one worker at a time for `lease_key`.
+
+    The worker that takes the lease runs `fn()`; the others poll the shared
+    result cache until a result for `result_key` stored after they started
+    waiting appears, or the lease is released or expires and they take over.
+    """
+    started = time.time()
+    while True:
+        if await asyncio.to_thread(store.try_lease, lease_key):
+            try:
+                return await fn()
+            finally:
+                await asyncio.to_thread(store.release_lease, lease_key)
+        store._stats["lease_waits"] += 1
+        await asyncio.sleep(LEASE_POLL_INTERVAL)
+        found = await asyncio.to_thread(store.get_result, result_key, max_age)
+        if found is not None and found[1] >= started:
+            return found[0]
+
+# Shared by everything in this worker when multi-worker mode is on
+store = SharedStore() if SHARED_STATE else None
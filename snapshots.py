@@ -0,0 +1,163 @@
+"""
+Web Grab & Capture - HTML Snapshot Store
+=========================================
+On-disk store of fetched pages shared by the Streamlit UI and the API.
+Both processes run on the same box, so a page fetched by one is served
+from disk to the other until it is older than SNAPSHOT_TTL.
+
+Snapshots live in a SQLite database (WAL mode, safe for concurrent
+readers and writers across processes) with zlib-compressed bodies, the
+response headers and the fetch time. The database is kept under
+SNAPSHOT_MAX_BYTES of compressed bodies by dropping expired snapshots
+first and then the least recently used ones. Database errors are
+swallowed: a broken store only means pages are fetched from the network.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Optional
+
+from cache import canonical_url
+from settings import DATA_DIR, env_int
+
+# ============== Settings ==============
+
+SNAPSHOT_DB = DATA_DIR / "snapshots.sqlite3"
+SNAPSHOT_TTL = env_int("WEBGRAB_SNAPSHOT_TTL", 600)
+SNAPSHOT_MAX_BYTES = env_int("WEBGRAB_SNAPSHOT_MAX_BYTES", 256 * 1024 * 1024)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    url TEXT PRIMARY KEY,
+    final_url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_accessed ON snapshots (accessed_at);
+"""
+
+# ============== Store ==============
+
+class SnapshotStore:
+    """Compressed HTML snapshots keyed by canonical URL"""
+
+    def __init__(self, path=SNAPSHOT_DB, ttl: int = SNAPSHOT_TTL, max_bytes: int = SNAPSHOT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._ready = False
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(SCHEMA)
+                    self._ready = True
+        return conn
+
+    @contextmanager
+    def _db(self):
+        """Connection that commits on success and is always closed"""
+        conn = self._connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, url: str) -> Optional[dict]:
+        """Return a fresh snapshot of `url` (final_url, status, headers, body, fetched_at) or None"""
+        if not self._ensure_dir():
+            return None
+        key = canonical_url(url)
+        now = time.time()
+        try:
+            with self._db() as conn:
+                row = conn.execute(
+                    "SELECT final_url, status, headers, body, fetched_at FROM snapshots WHERE url = ? AND fetched_at >= ?",
+                    (key, now - self.ttl),
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE snapshots SET accessed_at = ? WHERE url = ?", (now, key))
+        except sqlite3.Error:
+            row = None
+        if row is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        final_url, status, headers, body, fetched_at = row
+        return {
+            "final_url": final_url,
+            "status": status,
+            "headers": json.loads(headers),
+            "body": zlib.decompress(body),
+            "fetched_at": fetched_at,
+        }
+
+    def put(self, url: str, final_url: str, status: int, headers: dict, body: bytes):
+        """Store a fetched page, then evict to stay within the size quota"""
+        if not self._ensure_dir():
+            return
+        compressed = zlib.compress(body, 6)
+        if len(compressed) > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            with self._db() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (canonical_url(url), final_url, status, json.dumps(headers), compressed, len(compressed), now, now),
+                )
+                self._evict(conn, now)
+            self._stats["writes"] += 1
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired snapshots, then least recently used ones while over quota"""
+        removed = conn.execute("DELETE FROM snapshots WHERE fetched_at < ?", (now - self.ttl,)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM snapshots").fetchone()[0]
+        if total > self.max_bytes:
+            for url, size in conn.execute("SELECT url, size FROM snapshots ORDER BY accessed_at").fetchall():
+                conn.execute("DELETE FROM snapshots WHERE url = ?", (url,))
+                removed += 1
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        self._stats["evictions"] += removed
+
+    def _ensure_dir(self) -> bool:
+        """Create the data directory; snapshots are skipped if it isn't writable"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            return True
+        except OSError:
+            return False
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process and the shared store's size"""
+        stored = {"entries": 0, "bytes": 0}
+        if self.path.exists():
+            try:
+                with self._db() as conn:
+                    stored["entries"], stored["bytes"] = conn.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM snapshots"
+                    ).fetchone()
+            except sqlite3.Error:
+                pass
+        return {**self._stats, **stored, "ttl": self.ttl, "max_bytes": self.max_bytes}
+
+# Shared by every fetch in the process
+store = SnapshotStore()
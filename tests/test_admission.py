@@ -0,0 +1,27 @@
+"""Admission and deadline middlewares together, as api.py stacks them"""
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from admission import AdmissionLimiter, AdmissionMiddleware
+from deadlines import DeadlineMiddleware
+from sharedstore import SharedStore
+
+def make_app(store: SharedStore) -> Starlette:
+    async def scrape(request):
+        return JSONResponse({"url": request.query_params.get("url")})
+
+    app = Starlette(routes=[Route("/api/scrape", scrape)])
+    app.add_middleware(AdmissionMiddleware, limiter=AdmissionLimiter(per_client=2, shared=store))
+    app.add_middleware(DeadlineMiddleware)
+    return app
+
+def test_shared_slots_released_after_each_request(tmp_path):
+    store = SharedStore(tmp_path / "shared.sqlite3")
+    with TestClient(make_app(store)) as client:
+        for i in range(10):
+            response = client.get("/api/scrape", params={"url": f"https://example.com/{i}"})
+            assert response.status_code == 200
+    assert store.stats()["slots"] == 0